@@ -1,121 +1,143 @@
 import streamlit as st
-import json
 import os
-import hashlib
-import time
+import math
 import base64
-from datetime import datetime
+import uuid
+from user_store import DEMO_PREFIX, get_store_for, is_demo_username, safe_username
+from persistence import TrackedUserData, get_write_behind
+from user_schema import init_user_data
+from passwords import hash_password, verify_password
+from login_throttle import check_login_allowed, client_address, record_login_result
+from session_tokens import issue_token, revoke_token, verify_token
+from prompt_context import invalidate_profile_fragment
 
-# ---- INDIVIDUAL USER FILE MANAGEMENT ----
+# ---- INDIVIDUAL USER STORAGE ----
 def get_user_filename(username):
     """Get sanitized filename for user data"""
-    safe_username = "".join(c for c in username if c.isalnum() or c in ('_', '-')).lower()
-    return f"user_{safe_username}.json"
+    return f"user_{safe_username(username)}.json"
 
 def load_user_data(username):
-    """Load individual user data from their JSON file"""
+    """Load individual user data, preferring a save that is still queued for write-behind"""
     if not username:
         return None
-    filename = get_user_filename(username)
     try:
-        if os.path.exists(filename) and os.path.getsize(filename) > 0:
-            with open(filename, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return None
+        store = get_store_for(username)
+        user_data = get_write_behind(store).pending(username, get_session_id()) or store.load(username)
+        return TrackedUserData(user_data) if user_data is not None else None
     except Exception as e:
         st.error(f"Error loading user data: {e}")
         return None
 
-def save_user_data(username, user_data):
-    """Save individual user data to their JSON file"""
+def save_user_data(username, user_data, defer=False):
+    """Save user data if it changed; deferred saves are coalesced and written in the background"""
     if not username:
         return False
-    filename = get_user_filename(username)
+    if isinstance(user_data, TrackedUserData) and not user_data.is_dirty():
+        return True
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(user_data, f, indent=2, ensure_ascii=False, default=str)
+        queue = get_write_behind(get_store_for(username))
+        if defer:
+            queue.schedule(username, user_data, get_session_id())
+            if isinstance(user_data, TrackedUserData):
+                user_data.mark_clean()
+        else:
+            written = queue.save_now(username, user_data, get_session_id())
+            if isinstance(user_data, TrackedUserData):
+                # Pick up the new version and anything merged in from other sessions
+                user_data.adopt(written)
         return True
     except Exception as e:
         st.error(f"Error saving user data: {e}")
         return False
 
+def get_session_id():
+    """Stable id of the current browser session, used to keep its deferred saves apart"""
+    if '_session_id' not in st.session_state:
+        st.session_state._session_id = uuid.uuid4().hex
+    return st.session_state._session_id
+
+def get_client_id():
+    """Network address of the browser, for login throttling; X-Forwarded-For only counts behind a trusted proxy"""
+    # Never the session id: a client could get a fresh throttle bucket by opening a new session
+    return client_address(st.context.ip_address, st.context.headers.get("X-Forwarded-For"))
+
 def user_exists(username):
-    """Check if user exists (has a JSON file)"""
-    filename = get_user_filename(username)
-    return os.path.exists(filename)
+    """Check if user exists in the storage backend"""
+    return get_store_for(username).exists(username)
 
 def create_user_account(username, password):
-    """Create new user account with individual JSON file"""
+    """Create new user account with its own user document"""
+    if is_demo_username(username):
+        return False, "Usernames starting with 'demo_user_' are reserved!"
     if user_exists(username):
         return False, "Username already exists!"
     user_data = init_user_data(username)
     user_data['password'] = hash_password(password)
-    if save_user_data(username, user_data):
-        return True, "Account created successfully!"
-    else:
+    try:
+        # Insert-only: a sign-up that raced this one, or a user missing from the index, is never overwritten
+        if get_store_for(username).create(username, user_data) is None:
+            return False, "Username already exists!"
+    except Exception as e:
+        st.error(f"Error saving user data: {e}")
         return False, "Error creating account!"
+    return True, "Account created successfully!"
+
+def create_demo_account():
+    """Create a throwaway demo account in the in-memory demo store and return its username"""
+    demo_username = f"{DEMO_PREFIX}{uuid.uuid4().hex[:12]}"
+    if save_user_data(demo_username, init_user_data(demo_username)):
+        return demo_username
+    return None
 
 def verify_user_login(username, password):
-    """Verify user login credentials"""
+    """Verify user login credentials against the auth index; the full document is only read on success"""
+    credentials = get_store_for(username).credentials(username)
+    if not credentials:
+        return False, None
+    matches, needs_rehash = verify_password(password, credentials.get('password'))
+    if not matches:
+        return False, None
     user_data = load_user_data(username)
-    if user_data and user_data.get('password') == hash_password(password):
-        return True, user_data
-    return False, None
+    if needs_rehash and user_data is not None:
+        # Upgrade legacy SHA-256 (or outdated cost) hashes now that we know the password
+        user_data['password'] = hash_password(password)
+        save_user_data(username, user_data)
+    return True, user_data
 
-# ---- HELPER FUNCTIONS ----
-def hash_password(password):
-    """Hash password using SHA-256"""
-    return hashlib.sha256(password.encode()).hexdigest()
+# ---- SESSIONS ----
+def start_session(username):
+    """Log the browser session in and remember it in a signed ?session= token so reloads resume it"""
+    token = issue_token(username)
+    # Another server process may have changed the profile since this one cached its prompt fragment
+    invalidate_profile_fragment(username)
+    st.session_state.logged_in = True
+    st.session_state.username = username
+    st.session_state.session_token = token
+    st.query_params["session"] = token
+
+def restore_session():
+    """Resume a session from the ?session= token after a reload; no password check or KDF needed"""
+    token = st.query_params.get("session")
+    username = verify_token(token)
+    if username and user_exists(username):
+        st.session_state.logged_in = True
+        st.session_state.username = username
+        st.session_state.session_token = token
+        return True
+    if token:
+        del st.query_params["session"]
+    return False
 
-def init_user_data(username):
-    """Initialize clean user data structure"""
-    return {
-        'username': username,
-        'password': '',
-        'created_at': datetime.now().isoformat(),
-        'profile': {
-            'name': username.title(),
-            'current_role': 'Student',
-            'experience_level': 'Beginner',
-            'location': '',
-            'education': '',
-            'preferred_work_type': 'Remote',
-            'availability': 'Learning and growing',
-            'bio': '',
-            'goal': '',
-            'interests': [],
-            'completion': 20
-        },
-        'skills': {
-            'technical': {
-                'Python': 0,
-                'JavaScript': 0,
-                'HTML/CSS': 0,
-                'SQL': 0,
-                'React': 0,
-                'Machine Learning': 0
-        },
-            'soft': {
-                'Communication': 50,
-                'Teamwork': 50,
-                'Problem Solving': 50,
-                'Leadership': 30,
-                'Time Management': 40,
-                'Adaptability': 45
-            }
-            },
-            'goals_tracking': {
-                    'short_term': [],
-                    'long_term': [],
-                    'completed': []
-                },
-                'chat_history': [],
-                'xp': 0,
-                'level': 1,
-                'badges': ['New Member'],
-                'streak': 1,
-                'last_active': datetime.now().isoformat()
-            }
+def logout():
+    """End the session and revoke its token"""
+    revoke_token(st.session_state.get('session_token'))
+    st.session_state.session_token = None
+    st.session_state.logged_in = False
+    st.session_state.username = None
+    if "session" in st.query_params:
+        del st.query_params["session"]
+
+# ---- HELPER FUNCTIONS ----
 
 def get_logo_base64():
     """Get base64 encoded logo if it exists"""
@@ -344,24 +366,22 @@ def render_login_tab():
         with col_demo:
             demo_login = st.form_submit_button("Try Demo")
         if login_submitted and username and password:
-            success, user_data = verify_user_login(username, password)
-            if success:
-                st.session_state.logged_in = True
-                st.session_state.username = username
-                st.success("Welcome back!")
-                time.sleep(1)
-                st.rerun()
+            client_id = get_client_id()
+            retry_after = check_login_allowed(username, client_id)
+            if retry_after:
+                st.error(f"Too many login attempts. Please try again in {math.ceil(retry_after)} seconds.")
             else:
-                st.error("Invalid username or password!")
+                success, user_data = verify_user_login(username, password)
+                record_login_result(username, client_id, success)
+                if success:
+                    start_session(username)
+                    st.rerun()
+                else:
+                    st.error("Invalid username or password!")
         if demo_login:
-            demo_username = f"demo_user_{int(time.time())}"
-            demo_password = "demo123"
-            success, message = create_user_account(demo_username, demo_password)
-            if success:
-                st.session_state.logged_in = True
-                st.session_state.username = demo_username
-                st.success("Demo account created! Explore Zyra now.")
-                time.sleep(1)
+            demo_username = create_demo_account()
+            if demo_username:
+                start_session(demo_username)
                 st.rerun()
             else:
                 st.error("Error creating demo account!")
@@ -395,6 +415,8 @@ def init_session_state():
         st.session_state.username = None
     if 'current_page' not in st.session_state:
         st.session_state.current_page = 'chat'
+    if not st.session_state.logged_in:
+        restore_session()
 
 # To run:
 if __name__ == "__main__":
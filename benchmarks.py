@@ -0,0 +1,297 @@
+"""
+Micro-benchmarks for Zyra's storage and rendering paths
+Run: python benchmarks.py <benchmark> [options]
+"""
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+SAMPLE_QUESTIONS = [
+    "How do I become a data scientist in India?",
+    "Which skills should I learn next for a backend developer role?",
+    "Can you review my plan to switch from testing to product management?",
+    "What salary can a fresher full-stack developer expect in Bangalore?",
+    "How should I prepare for system design interviews?",
+]
+
+SAMPLE_REPLY = """Great question! Based on your profile, here is a focused plan:
+
+1. **Strengthen the fundamentals** - Python, SQL and statistics are non-negotiable.
+2. **Build 2-3 portfolio projects** - pick real Indian datasets (e.g. NSE prices, census data).
+3. **Learn the tooling** - pandas, scikit-learn, and one cloud platform.
+
+**Salary outlook:** entry-level roles typically start at ₹6-10 LPA, rising to ₹15-25 LPA with 3+ years.
+
+*Next step:* spend the next 4 weeks on one end-to-end project and publish it on GitHub."""
+
+
+def make_user_document(messages, seed=7):
+    """A realistic user document with `messages` chat messages"""
+    from user_schema import init_user_data
+
+    rng = random.Random(seed)
+    user_data = init_user_data("benchmark_user")
+    user_data['profile'].update({
+        'location': 'Pune', 'education': 'B.Tech Computer Science',
+        'goal': 'Become a data scientist', 'interests': ['Data Science', 'Machine Learning'],
+    })
+    start = datetime(2025, 1, 1)
+    history = []
+    for i in range(messages):
+        sender = 'user' if i % 2 == 0 else 'bot'
+        content = rng.choice(SAMPLE_QUESTIONS) if sender == 'user' else SAMPLE_REPLY
+        history.append({
+            'sender': sender,
+            'content': content,
+            'timestamp': (start + timedelta(seconds=30 * i)).isoformat(),
+        })
+    user_data['chat_history'] = history
+    return user_data
+
+
+def _best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_codec(args):
+    """Compare the legacy indented stdlib encoding with the compact codec"""
+    import user_codec
+
+    legacy_encode = lambda doc: json.dumps(doc, indent=2, ensure_ascii=False, default=str).encode('utf-8')
+    stdlib_compact = lambda doc: json.dumps(doc, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+    codecs = [
+        ("legacy json indent=2", legacy_encode, json.loads),
+        ("json compact", stdlib_compact, json.loads),
+        (f"user_codec ({user_codec.CODEC_NAME})", user_codec.encode, user_codec.decode),
+    ]
+    print(f"{'messages':>9} {'codec':<24} {'encode ms':>10} {'decode ms':>10} {'bytes':>11}")
+    for messages in args.messages:
+        doc = make_user_document(messages)
+        for name, enc, dec in codecs:
+            data = enc(doc)
+            encode_s = _best_of(lambda: enc(doc), args.repeat)
+            decode_s = _best_of(lambda: dec(data), args.repeat)
+            print(f"{messages:>9} {name:<24} {encode_s * 1e3:>10.2f} {decode_s * 1e3:>10.2f} {len(data):>11,}")
+
+
+def bench_login(args):
+    """Password verification latency and throughput at different scrypt cost settings"""
+    import hashlib
+    import passwords
+
+    passwords.HASH_WORKERS = args.workers
+    password = "correct horse battery staple"
+    rows = [("legacy sha256", hashlib.sha256(password.encode()).hexdigest())]
+    rows += [(f"scrypt n=2^{n.bit_length() - 1} r={args.r}", passwords.hash_password(password, n, args.r, 1))
+             for n in args.cost]
+    print(f"{passwords.HASH_WORKERS} hashing workers, {args.concurrency} concurrent logins")
+    print(f"{'hash':<22} {'p50 ms':>8} {'p95 ms':>8} {'logins/s':>10} {'loaded p95 ms':>14}")
+    for name, stored in rows:
+        latencies = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            passwords.verify_password(password, stored)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+
+        loaded = []
+        def login():
+            start = time.perf_counter()
+            passwords.verify_password(password, stored)
+            loaded.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as clients:
+            for _ in range(args.logins):
+                clients.submit(login)
+        throughput = args.logins / (time.perf_counter() - start)
+        loaded.sort()
+        print(f"{name:<22} {statistics.median(latencies) * 1e3:>8.2f} "
+              f"{latencies[int(len(latencies) * 0.95)] * 1e3:>8.2f} {throughput:>10,.0f} "
+              f"{loaded[int(len(loaded) * 0.95)] * 1e3:>14.2f}")
+
+
+def bench_render(args):
+    """Chat message rendering per 1k messages: Markdown on every rerun versus the fragment stored at write time"""
+    from message_render import message_html, render_markdown
+
+    history = make_user_document(args.messages)['chat_history']
+    stored = [dict(message, html=render_markdown(message['content'])) for message in history]
+    per_k = 1000 / len(history)
+    content_bytes = sum(len(m['content'].encode('utf-8')) for m in history)
+    html_bytes = sum(len(m['html'].encode('utf-8')) for m in stored)
+    cases = [
+        ("render on every rerun", lambda: [render_markdown(m['content']) for m in history]),
+        ("stored fragment", lambda: [message_html(m) for m in stored]),
+    ]
+    print(f"{'path':<24} {'ms per 1k messages':>19}")
+    for name, fn in cases:
+        print(f"{name:<24} {_best_of(fn, args.repeat) * 1e3 * per_k:>19.2f}")
+    print(f"stored HTML adds {html_bytes * per_k / 1024:.0f} KiB per 1k messages "
+          f"({html_bytes / content_bytes:.1f}x the raw text)")
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, len(ordered) * pct // 100)] if ordered else 0.0
+
+
+def bench_chat(args):
+    """End-to-end chat path (memory, prompt, cache, gateway) against the local stub provider"""
+    import llm_gateway
+    from chat_interface import create_ai_context
+    from conversation_memory import format_memory, update_memory
+    from llm_providers import StubProvider
+    from response_cache import ResponseCache, make_key
+    from user_schema import init_user_data
+
+    provider = StubProvider(ttft=args.ttft, tokens_per_sec=args.tokens_per_sec,
+                            failure_rate=args.failure_rate, seed=args.seed)
+    gateway = llm_gateway.LLMGateway(provider, max_concurrency=args.concurrency)
+    cache = ResponseCache()
+    ttfts, latencies, failures = [], [], []
+    lock = threading.Lock()
+
+    def run_user(index):
+        rng = random.Random(args.seed + index)
+        username = f"bench_user_{index}"
+        user_data = init_user_data(username)
+        for _ in range(args.turns):
+            question = rng.choice(SAMPLE_QUESTIONS)
+            user_data['chat_history'].append({'sender': 'user', 'content': question})
+            summary, recent = update_memory(user_data, user_data['chat_history'][:-1])
+            memory_context = format_memory(summary, recent)
+            prompt, _ = create_ai_context(user_data, question, summary, recent, username=username)
+            key = make_key(question, user_data, memory_context)
+            start = time.perf_counter()
+            reply = cache.get(key, username)
+            first = time.perf_counter()
+            try:
+                if reply is None:
+                    parts = []
+                    for text in gateway.stream(prompt):
+                        if not parts:
+                            first = time.perf_counter()
+                        parts.append(text)
+                    reply = "".join(parts)
+                    cache.put(key, reply, username)
+            except Exception as e:
+                with lock:
+                    failures.append(type(e).__name__)
+                user_data['chat_history'].pop()
+                continue
+            with lock:
+                ttfts.append(first - start)
+                latencies.append(time.perf_counter() - start)
+            user_data['chat_history'].append({'sender': 'bot', 'content': reply})
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run_user, args=(i,)) for i in range(args.users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.users} users x {args.turns} turns in {elapsed:.1f}s: {len(latencies) / elapsed:,.1f} replies/s, "
+          f"{len(failures)} failed")
+    print(f"TTFT    p50 {_percentile(ttfts, 50) * 1e3:8.0f} ms   p95 {_percentile(ttfts, 95) * 1e3:8.0f} ms")
+    print(f"latency p50 {_percentile(latencies, 50) * 1e3:8.0f} ms   p95 {_percentile(latencies, 95) * 1e3:8.0f} ms")
+    print(f"gateway {gateway.metrics()}")
+    print(f"cache   {cache.stats()}")
+
+
+# Runs in a fresh interpreter: time to render the login screen of main.py with an empty session
+_STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+before = set(sys.modules)
+app = AppTest.from_file(sys.argv[1], default_timeout=120)
+app.run()
+painted = time.perf_counter()
+# Only what the app itself pulled in (the test harness already imports plotly, for one)
+loaded = set(sys.modules) - before
+heavy = sorted({name.split('.')[0] if name.startswith('plotly') else '.'.join(name.split('.')[:2])
+                for name in loaded if name.startswith(('google.generativeai', 'plotly'))}
+               | {name for name in ('chat_interface', 'profile_manager') if name in loaded})
+print(json.dumps({'streamlit_import': imported - start, 'first_paint': painted - imported,
+                  'login_rendered': any(b.label == 'Sign In' for b in app.button),
+                  'errors': [str(e.value) for e in app.exception], 'heavy_modules': heavy}))
+"""
+
+
+def bench_startup(args):
+    """Cold-start time until the login screen is rendered, each run in a fresh interpreter"""
+    import os
+    import subprocess
+    import sys
+
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    runs = []
+    for _ in range(args.repeat):
+        out = subprocess.run([sys.executable, "-c", _STARTUP_PROBE, app], capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    first = runs[0]
+    if first['errors'] or not first['login_rendered']:
+        print(f"login screen did not render: {first['errors']}")
+    print(f"{'run':>4} {'streamlit import ms':>20} {'first paint ms':>15}")
+    for i, run in enumerate(runs, 1):
+        print(f"{i:>4} {run['streamlit_import'] * 1e3:>20.0f} {run['first_paint'] * 1e3:>15.0f}")
+    print(f"median first paint: {statistics.median(r['first_paint'] for r in runs) * 1e3:.0f} ms")
+    print(f"page/client modules loaded before login: {', '.join(first['heavy_modules']) or 'none'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    codec = sub.add_parser("codec", help="user document encode/decode time and size")
+    codec.add_argument("--messages", type=int, nargs="+", default=[1000, 10000])
+    codec.add_argument("--repeat", type=int, default=5)
+    codec.set_defaults(func=bench_codec)
+
+    login = sub.add_parser("login", help="password hashing latency and throughput per scrypt cost")
+    login.add_argument("--cost", type=int, nargs="+", default=[2 ** 12, 2 ** 14, 2 ** 15], help="scrypt N values")
+    login.add_argument("--r", type=int, default=8)
+    login.add_argument("--workers", type=int, default=4, help="hashing pool size")
+    login.add_argument("--concurrency", type=int, default=32, help="simultaneous login attempts")
+    login.add_argument("--logins", type=int, default=200)
+    login.add_argument("--repeat", type=int, default=20)
+    login.set_defaults(func=bench_login)
+
+    chat = sub.add_parser("chat", help="end-to-end chat path against the local stub LLM provider")
+    chat.add_argument("--users", type=int, default=50)
+    chat.add_argument("--turns", type=int, default=5)
+    chat.add_argument("--concurrency", type=int, default=8, help="gateway concurrency limit")
+    chat.add_argument("--ttft", default="lognormal:400:0.5", help="stub time-to-first-token distribution (ms)")
+    chat.add_argument("--tokens-per-sec", type=float, default=60)
+    chat.add_argument("--failure-rate", type=float, default=0.0)
+    chat.add_argument("--seed", type=int, default=7)
+    chat.set_defaults(func=bench_chat)
+
+    render = sub.add_parser("render", help="chat message rendering cost per 1k messages")
+    render.add_argument("--messages", type=int, default=2000)
+    render.add_argument("--repeat", type=int, default=5)
+    render.set_defaults(func=bench_render)
+
+    startup = sub.add_parser("startup", help="cold-start time to first paint of the login screen")
+    startup.add_argument("--repeat", type=int, default=5)
+    startup.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,33 @@
 import streamlit as st
-import google.generativeai as genai
+import hashlib
+import os
+import threading
 import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime
 from auth_landing import load_user_data, save_user_data
+from user_schema import compute_level
+from llm_gateway import LLMUnavailableError, get_gateway
+from response_cache import get_response_cache, make_key, normalize_question
+from conversation_memory import estimate_tokens, format_memory, new_memory, update_memory
+from prompt_context import PROMPT_TOKEN_LIMIT, fit_to_budget, get_profile_fragment
+from message_render import message_html, render_markdown
+from chat_jobs import DONE, FAILED, get_chat_jobs
+from user_store import copy_document, get_store_for
 
 # ---- CONFIG ----
-API_KEY = st.secrets["API_KEY"]
-genai.configure(api_key=API_KEY)
-model = genai.GenerativeModel(model_name="models/gemini-2.5-flash")
+# Estimated tokens of the fixed instructions around the profile, memory and question
+PROMPT_FRAME_TOKENS = 190
+# Messages shown per page of the chat box; older pages are loaded on demand
+CHAT_PAGE_SIZE = int(os.environ.get("ZYRA_CHAT_PAGE_SIZE", "30"))
+# Rendered chat bubbles kept in memory, keyed by message id
+MESSAGE_HTML_CACHE_SIZE = int(os.environ.get("ZYRA_MESSAGE_HTML_CACHE_SIZE", "5000"))
+# Seconds between checks on replies that are still being generated
+CHAT_POLL_INTERVAL = float(os.environ.get("ZYRA_CHAT_POLL_INTERVAL", "0.5"))
+
+_message_html = OrderedDict()  # (message id, user initial) -> bubble markup
+_message_html_lock = threading.Lock()
 
 def load_chat_css():
     """Big box, chat and chatbox ALWAYS inside the box, welcome disappears after first message, old chats never show outside box"""
@@ -92,6 +112,31 @@ def load_chat_css():
         color: #2d3748;
     }
     
+    .chat-message-bubble p, .chat-message-bubble ul, .chat-message-bubble ol, .chat-message-bubble pre {
+        margin: 0 0 0.6rem 0;
+    }
+
+    .chat-message-bubble > :last-child {
+        margin-bottom: 0;
+    }
+
+    .chat-message-bubble h3, .chat-message-bubble h4, .chat-message-bubble h5, .chat-message-bubble h6 {
+        font-size: 1.1rem;
+        margin: 0.4rem 0;
+        padding: 0;
+    }
+
+    .chat-message-bubble pre {
+        white-space: pre-wrap;
+        background: rgba(45,55,72,0.06);
+        border-radius: 10px;
+        padding: 0.6rem 0.8rem;
+    }
+
+    .chat-message-bubble.user a, .chat-message-bubble.user code {
+        color: white;
+    }
+
     .chat-message-bubble.user {
         background: linear-gradient(135deg, #667eea 60%, #6c63ff 100%);
         color: white;
@@ -239,11 +284,19 @@ def render_chat_interface(user_data):
 
     if st.session_state.get("first_login", True):
         user_data['chat_history'] = []
+        user_data['memory'] = new_memory()
         save_user_data(st.session_state.username, user_data)
         st.session_state.first_login = False
+        st.session_state.chat_pages = 1
 
     load_chat_css()
     chat_history = user_data.get('chat_history', [])
+    # Replies are generated in the background and may have finished while the user was on another page
+    pending, finished = collect_chat_jobs(st.session_state.username, chat_history)
+    running = [job.id for job in pending if job.status != DONE]
+    # Idempotency key of the next submit; a replayed or double-clicked submit arrives with the same key
+    if 'chat_submit_key' not in st.session_state:
+        st.session_state.chat_submit_key = uuid.uuid4().hex
 
     with st.container():
         st.markdown('<div class="main-chat-boundary">', unsafe_allow_html=True)
@@ -254,34 +307,20 @@ def render_chat_interface(user_data):
         else:
             # Use a container for the chat history to enable scrolling
             with st.container(height=650):
-                for message in chat_history:
-                    if message['sender'] == 'user':
-                        user_initial = user_data['profile']['name'][0].upper() if user_data['profile']['name'] else 'U'
-                        st.markdown(f'''
-                        <div class="chat-message-row" style="justify-content:flex-end;">
-                            <div class="chat-message-bubble user">{message['content']}</div>
-                            <div class="chat-avatar user">{user_initial}</div>
-                        </div>
-                        ''', unsafe_allow_html=True)
-                    else:
-                        st.markdown(f'''
-                        <div class="chat-message-row" style="justify-content:flex-start;">
-                            <div class="chat-avatar bot">🤖</div>
-                            <div class="chat-message-bubble bot">{message['content']}</div>
-                        </div>
-                        ''', unsafe_allow_html=True)
-                
-                if st.session_state.get('processing_message', False):
-                    st.markdown('''
-                    <div class="typing-indicator">
-                        Zyra is thinking
-                        <div class="typing-dots">
-                            <div class="typing-dot"></div>
-                            <div class="typing-dot"></div>
-                            <div class="typing-dot"></div>
-                        </div>
-                    </div>
-                    ''', unsafe_allow_html=True)
+                # Only the newest pages are sent to the browser, so a rerun costs the same for any history length
+                messages, hidden = visible_messages(chat_history)
+                if hidden:
+                    st.button(f"⬆️ Load earlier messages ({hidden} more)", key="load_earlier",
+                              on_click=load_earlier_messages)
+                user_initial = get_user_initial(user_data)
+                for message in messages:
+                    st.markdown(cached_message_html(message, user_initial), unsafe_allow_html=True)
+                # Finished replies whose save this session cannot see yet
+                for job in pending:
+                    if job.status == DONE:
+                        st.markdown(cached_message_html(job.result['message'], user_initial), unsafe_allow_html=True)
+                if running:
+                    render_pending_replies(running)
 
         st.markdown('</div>', unsafe_allow_html=True) # close chat-content-area
         
@@ -297,67 +336,236 @@ def render_chat_interface(user_data):
             )
 
             # Wrap form content in the input-area-section div
-            send_button = st.form_submit_button("Send Message 🚀", type="primary")
+            send_button = st.form_submit_button("Send Message 🚀", type="primary", disabled=bool(running))
             st.markdown('</div>', unsafe_allow_html=True)
 
         st.markdown('</div>', unsafe_allow_html=True) # close main-chat-boundary
 
+    for job in finished:
+        show_job_outcome(job)
+
     if send_button and user_input.strip():
-        process_chat_message(user_input.strip(), user_data)
+        process_chat_message(user_input.strip(), user_data, st.session_state.chat_submit_key)
+
+TYPING_INDICATOR_HTML = '''
+<div class="typing-indicator">
+    Zyra is thinking
+    <div class="typing-dots">
+        <div class="typing-dot"></div>
+        <div class="typing-dot"></div>
+        <div class="typing-dot"></div>
+    </div>
+</div>
+'''
+
+def get_user_initial(user_data):
+    return user_data['profile']['name'][0].upper() if user_data['profile']['name'] else 'U'
+
+def render_message_html(message, user_initial):
+    """Chat bubble markup for one message"""
+    if message['sender'] == 'user':
+        return f'''
+        <div class="chat-message-row" style="justify-content:flex-end;">
+            <div class="chat-message-bubble user">{message_html(message)}</div>
+            <div class="chat-avatar user">{user_initial}</div>
+        </div>
+        '''
+    return f'''
+        <div class="chat-message-row" style="justify-content:flex-start;">
+            <div class="chat-avatar bot">🤖</div>
+            <div class="chat-message-bubble bot">{message_html(message)}</div>
+        </div>
+        '''
+
+def new_message(sender, content, message_id=None, **fields):
+    """A chat history entry with its own id and its content rendered to sanitized HTML once, for every view"""
+    return {'id': message_id or uuid.uuid4().hex, 'sender': sender, 'content': content,
+            'html': render_markdown(content), 'timestamp': datetime.now().isoformat(), **fields}
+
+def message_id(message):
+    """Id of a message; older messages saved without one are identified by sender, time and content"""
+    if message.get('id'):
+        return message['id']
+    key = f"{message.get('sender')}\x00{message.get('timestamp')}\x00{message.get('content')}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
 
-def process_chat_message(user_input, user_data):
-    """Process chat message and generate AI response, persistent history"""
+def cached_message_html(message, user_initial):
+    """render_message_html, computed once per message and reused on every rerun"""
+    key = (message_id(message), user_initial)
+    with _message_html_lock:
+        html = _message_html.get(key)
+        if html is not None:
+            _message_html.move_to_end(key)
+            return html
+    html = render_message_html(message, user_initial)
+    with _message_html_lock:
+        _message_html[key] = html
+        while len(_message_html) > MESSAGE_HTML_CACHE_SIZE:
+            _message_html.popitem(last=False)
+    return html
+
+def visible_messages(chat_history):
+    """The pages of history the user has opened: (newest messages, number of older ones still hidden)"""
+    shown = st.session_state.get('chat_pages', 1) * CHAT_PAGE_SIZE
+    start = max(0, len(chat_history) - shown)
+    return chat_history[start:], start
+
+def load_earlier_messages():
+    st.session_state.chat_pages = st.session_state.get('chat_pages', 1) + 1
+
+def clean_reply(text):
+    return text.replace("```", "").strip()
+
+def stream_reply(prompt, on_text):
+    """Stream the model's answer, passing the reply so far to on_text; returns (reply, metrics) with TTFT and total latency"""
+    start = time.perf_counter()
+    first_token_at = None
+    reply = ""
+    chunks = 0
+    # The shared gateway caps concurrent calls, retries and fails fast when the provider is degraded
+    for text in get_gateway().stream(prompt):
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+        reply += text
+        chunks += 1
+        on_text(clean_reply(reply))
+    end = time.perf_counter()
+    if not reply:
+        raise ValueError("The model returned an empty response")
+    metrics = {
+        'ttft_ms': round(((first_token_at or end) - start) * 1000),
+        'latency_ms': round((end - start) * 1000),
+        'chunks': chunks,
+    }
+    return clean_reply(reply), metrics
+
+def process_chat_message(user_input, user_data, submit_key=None):
+    """
+    Store the user's message and queue the reply; a chat worker generates and saves it while the page stays responsive.
+    submit_key is the submit's idempotency key and becomes the message id. A submit whose key is already
+    stored, or a question identical to one still being answered, attaches to that reply instead of queueing another.
+    """
     try:
-        st.session_state.processing_message = True
-        if 'chat_history' not in user_data:
-            user_data['chat_history'] = []
-        user_data['chat_history'].append({
-            'sender': 'user',
-            'content': user_input,
-            'timestamp': datetime.now().isoformat()
-        })
-        profile_context = create_ai_context(user_data, user_input)
-        with st.spinner("Zyra is thinking..."):
-            response = model.generate_content(profile_context)
-            bot_reply = response.text
-            bot_reply = bot_reply.replace("```", "").strip()
-
-        user_data['chat_history'].append({
-            'sender': 'bot',
-            'content': bot_reply,
-            'timestamp': datetime.now().isoformat()
-        })
-        update_user_progress(user_data, user_input)
-        save_user_data(st.session_state.username, user_data)
-        st.session_state.processing_message = False
+        username = st.session_state.username
+        submit_key = submit_key or uuid.uuid4().hex
+        request_key = normalize_question(user_input)
+        queue = get_chat_jobs()
+        store = get_store_for(username)
+        # Submits of one user are serialised, so two identical requests cannot both start a job
+        with store.user_lock(username):
+            stored = store.load(username) or {}
+            duplicate = queue.find(username, request_key) is not None or any(
+                message.get('id') == submit_key for message in stored.get('chat_history', [])
+            )
+            if not duplicate:
+                if 'chat_history' not in user_data:
+                    user_data['chat_history'] = []
+                user_data['chat_history'].append(new_message('user', user_input, message_id=submit_key))
+                # Earlier turns: a window of recent messages plus a rolling summary, within a fixed token budget
+                summary, recent = update_memory(user_data, user_data['chat_history'][:-1])
+                memory_context = format_memory(summary, recent)
+                profile_context, prompt_tokens = create_ai_context(user_data, user_input, summary, recent, username)
+                name = user_data.get('profile', {}).get('name', '')
+                cache_key = make_key(user_input, user_data, memory_context)
+                # The question is saved before the reply is queued, so the worker's save always lands after it
+                if not save_user_data(username, user_data):
+                    return
+                queue.submit(username, generate_reply, username, profile_context, prompt_tokens['total'],
+                             cache_key, name, key=request_key)
+        st.session_state.chat_submit_key = uuid.uuid4().hex
         st.rerun()
     except Exception as e:
-        st.session_state.processing_message = False
         st.error("I'm having trouble processing your message right now. Please try again in a moment.")
         st.error(f"Technical details: {str(e)}")
 
-def create_ai_context(user_data, user_input):
-    """Context for AI: personalized, Indian market, guidance style"""
-    profile = user_data.get('profile', {})
-    skills = user_data.get('skills', {})
-    context = f"""
-You are Zyra, an expert AI career advisor with deep knowledge of the Indian job market and global career trends.
+def generate_reply(job, username, prompt, prompt_tokens, cache_key, name):
+    """Runs on a chat worker: stream the reply into the job, then append it and the XP it earns to the stored document"""
+    cache = get_response_cache()
+    start = time.perf_counter()
+    bot_reply = cache.get(cache_key, name)
+    if bot_reply is not None:
+        elapsed_ms = round((time.perf_counter() - start) * 1000)
+        metrics = {'ttft_ms': elapsed_ms, 'latency_ms': elapsed_ms, 'chunks': 1, 'cached': True}
+    else:
+        bot_reply, metrics = stream_reply(prompt, job.set_text)
+        cache.put(cache_key, bot_reply, name)
+        metrics['prompt_tokens'] = prompt_tokens
+    metrics['reply_tokens'] = estimate_tokens(bot_reply)
+    metrics['queue_ms'] = round((job.started_at - job.created_at) * 1000)
+    message = new_message('bot', bot_reply, metrics=metrics)
+
+    store = get_store_for(username)
+    user_data = store.load(username)
+    if user_data is None:
+        raise LookupError(f"User {username!r} no longer exists")
+    base = copy_document(user_data)
+    user_data.setdefault('chat_history', []).append(message)
+    events = apply_chat_progress(user_data)
+    # Merged with anything the user's sessions saved while the reply was generated
+    store.save(username, user_data, base)
+    return {'message': message, 'events': events}
+
+def collect_chat_jobs(username, chat_history):
+    """
+    Split the user's jobs into (pending, finished). A reply counts as finished once it shows up in
+    chat_history; finished jobs are acknowledged, so their outcome is shown exactly once.
+    """
+    queue = get_chat_jobs()
+    jobs = queue.for_user(username)
+    if not jobs:
+        return [], []
+    stored = {message.get('id') for message in chat_history}
+    pending, finished = [], []
+    for job in jobs:
+        if job.status == FAILED or (job.status == DONE and job.result['message']['id'] in stored):
+            queue.acknowledge(job.id)
+            finished.append(job)
+        else:
+            pending.append(job)
+    return pending, finished
 
-You're currently helping {profile.get('name', 'User')}, who has the following profile:
+@st.fragment(run_every=CHAT_POLL_INTERVAL)
+def render_pending_replies(job_ids):
+    """Replies still being generated; only this fragment reruns while they stream in"""
+    jobs = [job for job in map(get_chat_jobs().get, job_ids) if job is not None]
+    if len(jobs) < len(job_ids) or any(job.finished for job in jobs):
+        # Rerun the whole page to show the stored reply, the new XP and any badges
+        st.rerun()
+    for job in jobs:
+        if job.text:
+            bubble = render_message_html({'sender': 'bot', 'content': job.text + " ▌"}, None)
+            st.markdown(bubble, unsafe_allow_html=True)
+        else:
+            st.markdown(TYPING_INDICATOR_HTML, unsafe_allow_html=True)
 
-PROFILE INFORMATION:
-- Current Role: {profile.get('current_role', 'Student')}
-- Experience Level: {profile.get('experience_level', 'Beginner')}
-- Location: {profile.get('location', 'India')}
-- Education: {profile.get('education', 'Not specified')}
-- Career Goal: {profile.get('goal', 'Professional growth')}
-- Interests: {', '.join(profile.get('interests', ['General career development']))}
+def show_job_outcome(job):
+    if job.status == FAILED:
+        if isinstance(job.error, LLMUnavailableError):
+            st.warning("Zyra is getting a lot of questions right now. Please try again in a minute.")
+        else:
+            st.error("I'm having trouble processing your message right now. Please try again in a moment.")
+            st.error(f"Technical details: {str(job.error)}")
+        return
+    for kind, text in job.result['events']:
+        if kind == 'level':
+            st.balloons()
+        st.success(text)
 
-CURRENT SKILLS:
-Technical Skills: {', '.join([f"{skill} ({level}%)" for skill, level in skills.get('technical', {}).items() if level > 0]) or 'None specified'}
-Soft Skills: {', '.join([f"{skill} ({level}%)" for skill, level in skills.get('soft', {}).items() if level > 50]) or 'Basic communication skills'}
+def create_ai_context(user_data, user_input, summary="", recent=(), username=None):
+    """
+    Context for AI: personalized, Indian market, guidance style, plus the conversation so far.
+    Returns the prompt and its estimated tokens per part; memory is trimmed to keep the total under PROMPT_TOKEN_LIMIT.
+    """
+    fragment, fragment_tokens = get_profile_fragment(username or st.session_state.username, user_data)
+    fixed_tokens = PROMPT_FRAME_TOKENS + fragment_tokens + estimate_tokens(user_input)
+    memory_context = fit_to_budget(summary, recent, PROMPT_TOKEN_LIMIT - fixed_tokens)
+    memory_section = f"{memory_context}\n\n" if memory_context else ""
+    context = f"""
+You are Zyra, an expert AI career advisor with deep knowledge of the Indian job market and global career trends.
+
+{fragment}
 
-USER'S QUESTION: "{user_input}"
+{memory_section}USER'S QUESTION: "{user_input}"
 
 RESPONSE GUIDELINES:
 1. Provide personalized, actionable advice based on their profile
@@ -371,31 +579,38 @@ RESPONSE GUIDELINES:
 
 Respond in a warm, professional tone as their personal career mentor.
     """
-    return context
+    memory_tokens = estimate_tokens(memory_context)
+    tokens = {
+        'profile': fragment_tokens,
+        'memory': memory_tokens,
+        'question': estimate_tokens(user_input),
+        'total': fixed_tokens + memory_tokens,
+    }
+    return context, tokens
 
-def update_user_progress(user_data, user_input):
-    """XP, level, badges, persistent progress"""
+def apply_chat_progress(user_data):
+    """XP, level, badges, persistent progress; returns (kind, message) pairs to celebrate"""
+    events = []
     user_data['xp'] = user_data.get('xp', 0) + 15
-    new_level = max(1, user_data['xp'] // 200)
+    new_level = compute_level(user_data['xp'])
     old_level = user_data.get('level', 1)
     user_data['level'] = new_level
     if new_level > old_level:
-        st.balloons()
-        st.success(f"Congratulations! You've reached Level {new_level}!")
+        events.append(('level', f"Congratulations! You've reached Level {new_level}!"))
     badges = user_data.get('badges', [])
     chat_count = len(user_data.get('chat_history', []))
     if chat_count >= 2 and "First Chat" not in badges:
         badges.append("First Chat")
         user_data['xp'] += 25
-        st.success("Badge earned: First Chat!")
+        events.append(('badge', "Badge earned: First Chat!"))
     if chat_count >= 10 and "Regular User" not in badges:
         badges.append("Regular User")
         user_data['xp'] += 50
-        st.success("Badge earned: Regular User!")
+        events.append(('badge', "Badge earned: Regular User!"))
     if chat_count >= 25 and "Career Explorer" not in badges:
         badges.append("Career Explorer")
         user_data['xp'] += 101
-        st.success("Badge earned: Career Explorer!")
+        events.append(('badge', "Badge earned: Career Explorer!"))
     user_data['badges'] = badges
     user_data['last_active'] = datetime.now().isoformat()
-
+    return events
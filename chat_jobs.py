@@ -0,0 +1,142 @@
+"""
+Background reply generation for Zyra
+Chat replies run on a worker pool; each job has an id and a status that the chat view polls
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from user_store import safe_username
+
+# ---- CONFIG ----
+# Replies generated at once in this process; the LLM gateway still caps calls upstream
+CHAT_WORKERS = int(os.environ.get("ZYRA_CHAT_WORKERS", "8"))
+# Seconds a finished job is kept for the chat view to pick up
+CHAT_JOB_TTL = float(os.environ.get("ZYRA_CHAT_JOB_TTL", "600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+logger = logging.getLogger(__name__)
+
+
+class ChatJob:
+    """One reply being generated; the worker writes to it and any session of the user reads it"""
+
+    def __init__(self, username, key=None):
+        self.id = uuid.uuid4().hex
+        self.username = safe_username(username)
+        self.key = key  # identifies identical requests, which share this job while it runs
+        self.status = QUEUED
+        self.text = ""  # reply streamed so far
+        self.result = None  # what the work function returned
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    def set_text(self, text):
+        self.text = text
+
+
+class ChatJobQueue:
+    """Worker pool plus the server-side registry of jobs, so a job outlives the script run that started it"""
+
+    def __init__(self, workers=CHAT_WORKERS, ttl=CHAT_JOB_TTL):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="zyra-chat")
+        self._jobs = {}  # job id -> job, in submission order
+        self._lock = threading.Lock()
+        self.attached = 0
+
+    def submit(self, username, work, *args, key=None):
+        """
+        Run work(job, *args) on the pool; its return value becomes job.result. While a job
+        with the same key is still running for the user, that job is returned instead.
+        """
+        with self._lock:
+            job = self._find(safe_username(username), key)
+            if job is not None:
+                self.attached += 1
+                return job
+            self._expire()
+            job = ChatJob(username, key)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, work, args)
+        return job
+
+    def _run(self, job, work, args):
+        job.started_at = time.time()
+        job.status = RUNNING
+        try:
+            job.result = work(job, *args)
+            job.status = DONE
+        except Exception as e:
+            logger.info("Chat job %s failed: %s", job.id, type(e).__name__)
+            job.error = e
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def find(self, username, key):
+        """The user's unfinished job for key, if any"""
+        with self._lock:
+            return self._find(safe_username(username), key)
+
+    def _find(self, username, key):
+        if key is None:
+            return None
+        for job in self._jobs.values():
+            if job.username == username and job.key == key and not job.finished:
+                return job
+        return None
+
+    def for_user(self, username):
+        """The user's jobs that nobody has acknowledged yet, oldest first"""
+        key = safe_username(username)
+        with self._lock:
+            return [job for job in self._jobs.values() if job.username == key]
+
+    def acknowledge(self, job_id):
+        """Forget a finished job once a session has shown its outcome"""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [job.id for job in self._jobs.values() if job.finished and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            counts['attached'] = self.attached
+        return counts
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_chat_jobs():
+    """Return the process-wide chat job queue"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = ChatJobQueue()
+    return _queue
@@ -0,0 +1,124 @@
+"""
+Conversation memory for Zyra's prompts
+Recent turns inside a token budget, older turns folded into a rolling summary stored with the user
+"""
+import os
+import re
+
+# ---- CONFIG ----
+# Tokens of verbatim recent messages sent with each question
+MEMORY_TOKEN_BUDGET = int(os.environ.get("ZYRA_MEMORY_TOKEN_BUDGET", "1200"))
+# Upper bound for the rolling summary of older messages; the oldest summary lines are dropped first
+SUMMARY_TOKEN_BUDGET = int(os.environ.get("ZYRA_SUMMARY_TOKEN_BUDGET", "400"))
+# Characters of a message kept in its summary line
+SUMMARY_LINE_CHARS = 160
+# Per-message overhead of the "User: ..." framing in the prompt
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_MARKDOWN = re.compile(r"[*_`#>]+")
+_LIST_MARKER = re.compile(r"^\s*(?:[-*+•]|\d+[.)])\s+", re.MULTILINE)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English text)"""
+    return len(text) // 4 + 1 if text else 0
+
+
+def new_memory():
+    return {'summary': '', 'summarized_upto': 0}
+
+
+def _message_tokens(message):
+    return estimate_tokens(message.get('content', '')) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _summary_line(message):
+    """One line standing in for a message: its first sentence, without markdown"""
+    text = _MARKDOWN.sub("", _LIST_MARKER.sub("", message.get('content', ""))).strip()
+    text = _SENTENCE_END.split(" ".join(text.split()), maxsplit=1)[0]
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS - 1].rstrip() + "…"
+    return f"- {'User asked' if message.get('sender') == 'user' else 'Zyra advised'}: {text}"
+
+
+def _latest_turn_start(history):
+    """Index of the newest exchange: the last message, and the question before it when that is a reply"""
+    start = len(history) - 1
+    if start > 0 and history[start].get('sender') == 'bot' and history[start - 1].get('sender') == 'user':
+        start -= 1
+    return start
+
+
+def truncate_message(message, max_tokens):
+    """Copy of message whose content fits max_tokens, keeping its beginning"""
+    content = message.get('content', '')
+    if estimate_tokens(content) <= max_tokens:
+        return message
+    return dict(message, content=content[:max(0, max_tokens - 1) * 4].rstrip() + " …")
+
+
+def _fit_turn(turn, budget):
+    """The latest exchange cut to budget: the question gets up to a third, the reply the rest"""
+    if len(turn) == 1:
+        return [truncate_message(turn[0], budget - MESSAGE_OVERHEAD_TOKENS)]
+    question, reply = turn
+    question_tokens = min(_message_tokens(question), budget // 3)
+    return [truncate_message(question, question_tokens - MESSAGE_OVERHEAD_TOKENS),
+            truncate_message(reply, budget - question_tokens - MESSAGE_OVERHEAD_TOKENS)]
+
+
+def _trim_summary(summary, budget):
+    lines = summary.splitlines()
+    while lines and estimate_tokens("\n".join(lines)) > budget:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def update_memory(user_data, history, budget=MEMORY_TOKEN_BUDGET, summary_budget=SUMMARY_TOKEN_BUDGET):
+    """
+    Fold messages that no longer fit the recent window into user_data['memory'] and return
+    (summary, recent messages). Only messages that newly left the window are summarised, so
+    the work per turn stays constant however long the history is. The latest exchange always
+    stays in the recent window, cut down to the budget if it is longer on its own.
+    """
+    memory = user_data.get('memory')
+    if not isinstance(memory, dict) or memory.get('summarized_upto', 0) > len(history):
+        # No memory yet, or the chat history was cleared
+        memory = new_memory()
+
+    start, used = len(history), 0
+    while start > memory['summarized_upto']:
+        cost = _message_tokens(history[start - 1])
+        if used + cost > budget:
+            break
+        used += cost
+        start -= 1
+
+    truncated = None
+    if history and start > _latest_turn_start(history):
+        # Not even the newest exchange fits (long replies are normal): keep it, shortened
+        start = max(memory['summarized_upto'], _latest_turn_start(history))
+        truncated = _fit_turn(history[start:], budget)
+
+    if start > memory['summarized_upto']:
+        folded = [_summary_line(message) for message in history[memory['summarized_upto']:start]]
+        summary = "\n".join(filter(None, [memory['summary']] + folded))
+        memory = {'summary': _trim_summary(summary, summary_budget), 'summarized_upto': start}
+    if user_data.get('memory') != memory:
+        user_data['memory'] = memory
+    return memory['summary'], truncated if truncated is not None else history[start:]
+
+
+def format_memory(summary, recent):
+    """Prompt section with the conversation so far; empty for a fresh conversation"""
+    sections = []
+    if summary:
+        sections.append(f"EARLIER IN THIS CONVERSATION (summary):\n{summary}")
+    if recent:
+        lines = "\n".join(
+            f"{'User' if message.get('sender') == 'user' else 'Zyra'}: {message.get('content', '')}"
+            for message in recent
+        )
+        sections.append(f"RECENT MESSAGES:\n{lines}")
+    return "\n\n".join(sections)
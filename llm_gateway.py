@@ -0,0 +1,225 @@
+"""
+Process-wide gateway for Zyra's LLM calls
+Bounded concurrency, per-request deadlines, jittered retries, a circuit breaker and latency metrics
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from llm_providers import create_provider
+
+try:
+    from google.api_core import exceptions as google_exceptions
+except ImportError:  # pragma: no cover - depends on the environment
+    google_exceptions = None
+
+# ---- CONFIG ----
+# Requests allowed upstream at once; more wait in line for up to LLM_QUEUE_TIMEOUT seconds
+LLM_MAX_CONCURRENCY = int(os.environ.get("ZYRA_LLM_MAX_CONCURRENCY", "8"))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("ZYRA_LLM_QUEUE_TIMEOUT", "15"))
+# Deadline for a whole request, retries included
+LLM_TIMEOUT = float(os.environ.get("ZYRA_LLM_TIMEOUT", "60"))
+# Retries of transient upstream errors, with exponential backoff and full jitter
+LLM_RETRIES = int(os.environ.get("ZYRA_LLM_RETRIES", "3"))
+LLM_RETRY_BASE = float(os.environ.get("ZYRA_LLM_RETRY_BASE", "0.5"))
+LLM_RETRY_MAX = float(os.environ.get("ZYRA_LLM_RETRY_MAX", "8"))
+# Consecutive transient failures that open the circuit, and how long it stays open
+BREAKER_THRESHOLD = int(os.environ.get("ZYRA_LLM_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.environ.get("ZYRA_LLM_BREAKER_COOLDOWN", "30"))
+# Recent requests kept for latency percentiles
+METRICS_WINDOW = 1000
+
+_TRANSIENT_ERRORS = (ConnectionError, TimeoutError)
+if google_exceptions is not None:
+    _TRANSIENT_ERRORS += (
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+        google_exceptions.BadGateway,
+        google_exceptions.GatewayTimeout,
+    )
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailableError(Exception):
+    """The assistant cannot take the request right now (circuit open, queue full or deadline exceeded)"""
+
+
+class CircuitBreaker:
+    """
+    Closed while upstream is healthy; opens after `threshold` consecutive failures and
+    fails fast for `cooldown` seconds, then lets a single trial request through (half-open).
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_at = None  # when the current half-open trial request started
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.cooldown:
+                return False
+            # One trial at a time; a trial that never reported back is replaced after another cooldown
+            if self._trial_at is not None and now - self._trial_at < self.cooldown:
+                return False
+            self._trial_at = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_at is not None or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logger.warning("LLM circuit opened after %d consecutive failures", self.failures)
+                self.opened_at = time.monotonic()
+                self._trial_at = None
+
+
+class LLMGateway:
+    """Every LLM request in the process goes through here"""
+
+    def __init__(self, provider=None, max_concurrency=LLM_MAX_CONCURRENCY, queue_timeout=LLM_QUEUE_TIMEOUT,
+                 timeout=LLM_TIMEOUT, retries=LLM_RETRIES, breaker=None):
+        self._provider = provider
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._in_flight = 0
+        self._counts = {'requests': 0, 'succeeded': 0, 'failed': 0, 'retries': 0, 'rejected': 0}
+        self._latencies = deque(maxlen=METRICS_WINDOW)
+        self._ttfts = deque(maxlen=METRICS_WINDOW)
+
+    @property
+    def provider(self):
+        """The model backend, created on first use so importing the app needs no credentials"""
+        if self._provider is None:
+            with self._lock:
+                if self._provider is None:
+                    self._provider = create_provider()
+        return self._provider
+
+    def stream(self, prompt):
+        """
+        Yield the reply text chunk by chunk. Transient errors are retried until the first
+        chunk arrives; after that a failure is raised, since the partial reply is already shown.
+        Raises LLMUnavailableError when the request cannot be served in time.
+        """
+        deadline = time.monotonic() + self.timeout
+        self._count('requests')
+        if not self.breaker.allow():
+            self._count('rejected')
+            raise LLMUnavailableError("circuit open")
+        self._acquire_slot(deadline)
+        start = time.monotonic()
+        first_chunk_at = None
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise LLMUnavailableError("deadline exceeded")
+                    for text in self.provider.stream(prompt, timeout=remaining):
+                        if first_chunk_at is None:
+                            first_chunk_at = time.monotonic()
+                        elif time.monotonic() > deadline:
+                            raise LLMUnavailableError("deadline exceeded")
+                        yield text
+                    break
+                except _TRANSIENT_ERRORS as e:
+                    self.breaker.record_failure()
+                    if first_chunk_at is not None or attempt == self.retries:
+                        raise LLMUnavailableError("upstream unavailable") from e
+                    delay = random.uniform(0, min(LLM_RETRY_MAX, LLM_RETRY_BASE * 2 ** attempt))
+                    if time.monotonic() + delay >= deadline or not self.breaker.allow():
+                        raise LLMUnavailableError("upstream unavailable") from e
+                    logger.info("Retrying LLM request after %s (attempt %d)", type(e).__name__, attempt + 1)
+                    self._count('retries')
+                    time.sleep(delay)
+            self.breaker.record_success()
+            self._count('succeeded')
+            with self._lock:
+                self._latencies.append(time.monotonic() - start)
+                if first_chunk_at is not None:
+                    self._ttfts.append(first_chunk_at - start)
+        except BaseException:
+            self._count('failed')
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def generate(self, prompt):
+        """Whole reply as one string"""
+        return "".join(self.stream(prompt))
+
+    def _acquire_slot(self, deadline):
+        with self._lock:
+            self._waiting += 1
+        try:
+            acquired = self._slots.acquire(timeout=max(0, min(self.queue_timeout, deadline - time.monotonic())))
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        if not acquired:
+            self._count('rejected')
+            raise LLMUnavailableError("too many requests in flight")
+        with self._lock:
+            self._in_flight += 1
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def metrics(self):
+        """Queue depth, in-flight requests, outcome counters, breaker state and latency percentiles (ms)"""
+        with self._lock:
+            metrics = dict(self._counts, queue_depth=self._waiting, in_flight=self._in_flight,
+                           breaker=self.breaker.state)
+            for name, samples in (('latency', self._latencies), ('ttft', self._ttfts)):
+                ordered = sorted(samples)
+                for pct in (50, 95, 99):
+                    value = ordered[min(len(ordered) - 1, len(ordered) * pct // 100)] if ordered else None
+                    metrics[f'{name}_p{pct}_ms'] = round(value * 1000) if value is not None else None
+        return metrics
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Return the process-wide gateway for the configured provider"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
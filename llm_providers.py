@@ -0,0 +1,157 @@
+"""
+LLM providers for Zyra
+Gemini for production and a deterministic local stub for offline load tests; nothing connects at import time
+"""
+import hashlib
+import os
+import random
+import threading
+import time
+
+# ---- CONFIG ----
+# "gemini" or "stub"
+LLM_PROVIDER = os.environ.get("ZYRA_LLM_PROVIDER", "gemini").lower()
+GEMINI_MODEL = os.environ.get("ZYRA_GEMINI_MODEL", "models/gemini-2.5-flash")
+# Stub behaviour: time to first token as a distribution ("fixed:MS", "uniform:LOW:HIGH" or
+# "lognormal:MEDIAN:SIGMA"), streaming speed, and injected failure rates
+STUB_TTFT = os.environ.get("ZYRA_STUB_TTFT", "lognormal:400:0.5")
+STUB_TOKENS_PER_SEC = float(os.environ.get("ZYRA_STUB_TOKENS_PER_SEC", "60"))
+STUB_REPLY_TOKENS = int(os.environ.get("ZYRA_STUB_REPLY_TOKENS", "250"))
+STUB_FAILURE_RATE = float(os.environ.get("ZYRA_STUB_FAILURE_RATE", "0"))
+STUB_MIDSTREAM_FAILURE_RATE = float(os.environ.get("ZYRA_STUB_MIDSTREAM_FAILURE_RATE", "0"))
+STUB_SEED = int(os.environ.get("ZYRA_STUB_SEED", "0"))
+
+
+class LLMProvider:
+    """Interface every model backend implements"""
+
+    name = "base"
+
+    def stream(self, prompt, timeout=None):
+        """Yield the reply text in chunks; transient failures raise ConnectionError/TimeoutError or the client's own errors"""
+        raise NotImplementedError
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini through google-generativeai"""
+
+    name = "gemini"
+
+    def __init__(self, api_key, model_name=GEMINI_MODEL):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name=model_name)
+
+    def stream(self, prompt, timeout=None):
+        request_options = {'timeout': timeout} if timeout else None
+        for chunk in self.model.generate_content(prompt, stream=True, request_options=request_options):
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. only a finish reason)
+                continue
+            if text:
+                yield text
+
+
+STUB_PARAGRAPHS = [
+    "Based on your profile, focus first on the fundamentals that every hiring manager screens for.",
+    "**Next steps:** pick one project you can finish in four weeks and publish it on GitHub.",
+    "Entry-level roles in this area typically start at ₹6-10 LPA in metro cities, rising to ₹15-25 LPA with 3+ years.",
+    "1. Strengthen core skills\n2. Build a portfolio\n3. Network on LinkedIn and at local meetups",
+    "Keep a weekly learning log; consistency beats intensity when you are switching careers.",
+    "Consider certifications only after you have shipped real work; they complement rather than replace projects.",
+]
+
+
+def parse_distribution(spec):
+    """Turn "fixed:MS", "uniform:LOW:HIGH" or "lognormal:MEDIAN:SIGMA" into a sampler returning seconds"""
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    if kind == "fixed":
+        return lambda rng: values[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda rng: rng.lognormvariate(0, sigma) * median / 1000
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class StubProvider(LLMProvider):
+    """
+    Local stand-in for load tests. The reply and its timing are derived from the prompt and
+    the seed, so the same run is reproducible; failures are injected at the configured rates.
+    """
+
+    name = "stub"
+
+    def __init__(self, ttft=STUB_TTFT, tokens_per_sec=STUB_TOKENS_PER_SEC, reply_tokens=STUB_REPLY_TOKENS,
+                 failure_rate=STUB_FAILURE_RATE, midstream_failure_rate=STUB_MIDSTREAM_FAILURE_RATE, seed=STUB_SEED):
+        self.sample_ttft = parse_distribution(ttft)
+        self.tokens_per_sec = tokens_per_sec
+        self.reply_tokens = reply_tokens
+        self.failure_rate = failure_rate
+        self.midstream_failure_rate = midstream_failure_rate
+        self.seed = seed
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    def _rng(self, prompt):
+        # Repeated calls with the same prompt (e.g. retries) draw different but reproducible outcomes
+        with self._lock:
+            self._calls += 1
+            call = self._calls
+        digest = hashlib.sha1(f"{self.seed}:{call}:{prompt}".encode('utf-8')).digest()
+        return random.Random(digest)
+
+    def reply_for(self, prompt):
+        """Deterministic reply text for a prompt, about reply_tokens long"""
+        rng = random.Random(hashlib.sha1(f"{self.seed}:{prompt}".encode('utf-8')).digest())
+        paragraphs = []
+        while sum(len(p) for p in paragraphs) < self.reply_tokens * 4:
+            paragraphs.append(rng.choice(STUB_PARAGRAPHS))
+        return "\n\n".join(paragraphs)
+
+    def stream(self, prompt, timeout=None):
+        rng = self._rng(prompt)
+        deadline = time.monotonic() + timeout if timeout else None
+        ttft = self.sample_ttft(rng)
+        if deadline is not None and time.monotonic() + ttft > deadline:
+            time.sleep(max(0, deadline - time.monotonic()))
+            raise TimeoutError("stub provider timed out")
+        time.sleep(ttft)
+        if rng.random() < self.failure_rate:
+            raise ConnectionError("stub provider: injected failure")
+        words = self.reply_for(prompt).split(" ")
+        fail_at = rng.randrange(1, len(words)) if rng.random() < self.midstream_failure_rate else None
+        for i in range(0, len(words), 4):
+            if fail_at is not None and i >= fail_at:
+                raise ConnectionError("stub provider: injected mid-stream failure")
+            chunk = " ".join(words[i:i + 4]) + (" " if i + 4 < len(words) else "")
+            if i:
+                time.sleep(len(chunk) / 4 / self.tokens_per_sec)
+            yield chunk
+
+
+def _streamlit_secret(name):
+    try:
+        import streamlit as st
+
+        return st.secrets[name]
+    except Exception:
+        return None
+
+
+def create_provider(name=None):
+    """Build the configured provider; Gemini reads its key from GEMINI_API_KEY or st.secrets["API_KEY"]"""
+    name = (name or LLM_PROVIDER).lower()
+    if name == "stub":
+        return StubProvider()
+    if name == "gemini":
+        api_key = os.environ.get("GEMINI_API_KEY") or _streamlit_secret("API_KEY")
+        if not api_key:
+            raise RuntimeError("No Gemini API key: set API_KEY in .streamlit/secrets.toml or GEMINI_API_KEY")
+        return GeminiProvider(api_key)
+    raise ValueError(f"Unknown ZYRA_LLM_PROVIDER: {name}")
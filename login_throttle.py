@@ -0,0 +1,148 @@
+"""
+Login throttling for Zyra
+In-memory token buckets per account and per client, with exponential lockout after repeated failures
+"""
+import ipaddress
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# ---- CONFIG ----
+# Per account: burst of attempts, then one more every ACCOUNT_REFILL seconds
+ACCOUNT_BURST = int(os.environ.get("ZYRA_LOGIN_ACCOUNT_BURST", "5"))
+ACCOUNT_REFILL = float(os.environ.get("ZYRA_LOGIN_ACCOUNT_REFILL", "12"))
+# Per client (IP address): larger burst so shared networks still work
+CLIENT_BURST = int(os.environ.get("ZYRA_LOGIN_CLIENT_BURST", "20"))
+CLIENT_REFILL = float(os.environ.get("ZYRA_LOGIN_CLIENT_REFILL", "3"))
+# Consecutive failures before a key is locked out; the lockout doubles with every further failure
+LOCKOUT_AFTER = int(os.environ.get("ZYRA_LOGIN_LOCKOUT_AFTER", "5"))
+LOCKOUT_BASE = float(os.environ.get("ZYRA_LOGIN_LOCKOUT_BASE", "30"))
+LOCKOUT_MAX = float(os.environ.get("ZYRA_LOGIN_LOCKOUT_MAX", str(60 * 60)))
+# Keys tracked per limiter; the least recently seen are forgotten first
+MAX_TRACKED_KEYS = int(os.environ.get("ZYRA_LOGIN_MAX_KEYS", "100000"))
+# Reverse proxies (addresses or CIDR ranges, comma separated) whose X-Forwarded-For is believed;
+# empty ignores the header, since clients can set it to anything
+TRUSTED_PROXIES = os.environ.get("ZYRA_TRUSTED_PROXIES", "")
+# Streamlit reports no address for loopback peers, e.g. a reverse proxy on the same host
+LOOPBACK = "127.0.0.1"
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket per key plus a failure counter that triggers exponential lockouts.
+    Keys live in an LRU of bounded size, so a flood of distinct usernames or clients
+    costs a fixed amount of memory.
+    """
+
+    def __init__(self, burst, refill_seconds, lockout_after=LOCKOUT_AFTER, lockout_base=LOCKOUT_BASE,
+                 lockout_max=LOCKOUT_MAX, max_keys=MAX_TRACKED_KEYS):
+        self.burst = burst
+        self.refill_seconds = refill_seconds
+        self.lockout_after = lockout_after
+        self.lockout_base = lockout_base
+        self.lockout_max = lockout_max
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> [tokens, last refill, consecutive failures, locked until]
+        self._lock = threading.Lock()
+
+    def _bucket(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.burst), now, 0, 0.0]
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) / self.refill_seconds)
+            bucket[1] = now
+        return bucket
+
+    def acquire(self, key, now=None):
+        """Take one attempt for key; returns 0 when allowed, otherwise seconds until the next attempt"""
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            bucket = self._bucket(key, now)
+            if bucket[3] > now:
+                return bucket[3] - now
+            if bucket[0] < 1:
+                return (1 - bucket[0]) * self.refill_seconds
+            bucket[0] -= 1
+            return 0
+
+    def record_failure(self, key, now=None):
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            bucket = self._bucket(key, now)
+            bucket[2] += 1
+            if bucket[2] >= self.lockout_after:
+                lockout = self.lockout_base * 2 ** min(bucket[2] - self.lockout_after, 32)
+                bucket[3] = now + min(self.lockout_max, lockout)
+
+    def record_success(self, key):
+        """Clear the failure count and any lockout; spent tokens still refill at the normal rate"""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[2] = 0
+                bucket[3] = 0.0
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+_account_limiter = TokenBucketLimiter(ACCOUNT_BURST, ACCOUNT_REFILL)
+_client_limiter = TokenBucketLimiter(CLIENT_BURST, CLIENT_REFILL, lockout_after=CLIENT_BURST)
+
+
+def parse_networks(spec):
+    """"10.0.0.1, 172.16.0.0/12" -> list of ip networks"""
+    return [ipaddress.ip_network(part.strip(), strict=False) for part in spec.split(",") if part.strip()]
+
+
+_trusted_proxies = parse_networks(TRUSTED_PROXIES)
+
+
+def _is_trusted(address, trusted):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted)
+
+
+def client_address(peer, forwarded_for=None, trusted=None):
+    """
+    Address to throttle a request by. X-Forwarded-For only counts when the direct peer is a
+    trusted proxy; hops are then read from the right and the first untrusted one is the client,
+    so entries a client prepends itself are never used. A missing peer counts as loopback.
+    """
+    trusted = _trusted_proxies if trusted is None else trusted
+    peer = peer or LOOPBACK
+    if not forwarded_for or not _is_trusted(peer, trusted):
+        return peer
+    client = peer
+    for hop in reversed([hop.strip() for hop in forwarded_for.split(",") if hop.strip()]):
+        client = hop
+        if not _is_trusted(hop, trusted):
+            break
+    return client
+
+
+def check_login_allowed(username, client_id):
+    """Seconds the caller must wait before trying to log in (0 = go ahead); checked before any disk or KDF work"""
+    retry_after = _client_limiter.acquire(client_id)
+    if retry_after:
+        return retry_after
+    return _account_limiter.acquire(username.strip().lower())
+
+
+def record_login_result(username, client_id, success):
+    """Reset the counters after a successful login, or count a failure towards a lockout"""
+    account = username.strip().lower()
+    if success:
+        _account_limiter.record_success(account)
+        _client_limiter.record_success(client_id)
+    else:
+        _account_limiter.record_failure(account)
+        _client_limiter.record_failure(client_id)
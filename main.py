@@ -3,11 +3,13 @@ Designed Zyra AI Personalized Career Advisor
 Modern UI with clean top navigation and streamlined layout
 """
 import streamlit as st
-from auth_landing import login_page, init_session_state, load_user_data
-from chat_interface import render_chat_interface
-from profile_manager import render_profile_manager
+from auth_landing import login_page, init_session_state, load_user_data, save_user_data, logout
+from persistence import touch_last_active
+from user_store import start_demo_reaper
+from message_render import message_html
 import os
 import base64
+import importlib
 
 
 def main():
@@ -22,6 +24,9 @@ def main():
     # Initialize session state
     init_session_state()
     
+    # Expire idle demo accounts and clean up demo files older versions left on disk
+    start_demo_reaper()
+    
     # Initialize externals modal state
     if 'show_externals' not in st.session_state:
         st.session_state.show_externals = False
@@ -38,13 +43,12 @@ def main_dashboard():
     
     if not user_data:
         st.error("User data not found. Please login again.")
-        st.session_state.logged_in = False
+        logout()
         st.rerun()
         return
     
-    # Update user activity
-    from datetime import datetime
-    user_data['last_active'] = datetime.now().isoformat()
+    # Update user activity (throttled so reruns that change nothing skip the save)
+    touch_last_active(user_data)
     
     # Render unified top navigation with welcome
     render_unified_header(user_data)
@@ -59,9 +63,8 @@ def main_dashboard():
     # Render floating logout button
     render_floating_logout()
     
-    # Save updated user data
-    from auth_landing import save_user_data
-    save_user_data(st.session_state.username, user_data)
+    # Save updated user data; unchanged documents are skipped, changes are written behind
+    save_user_data(st.session_state.username, user_data, defer=True)
 
 def render_unified_header(user_data):
     """Render clean unified header with navigation and welcome"""
@@ -206,11 +209,14 @@ def render_unified_header(user_data):
         box-shadow: 0 0 15px rgba(102, 126, 234, 0.4) !important;
     }
     /* Enhanced floating logout button with glow */
-    .floating-logout-btn {
+    .st-key-floating_logout {
         position: fixed !important;
         bottom: 30px !important;
         right: 30px !important;
         z-index: 1000 !important;
+        width: auto !important;
+    }
+    .st-key-floating_logout .stButton > button {
         background: linear-gradient(135deg, #dc2626, #b91c1c) !important;
         color: white !important;
         border: none !important;
@@ -250,7 +256,7 @@ def render_unified_header(user_data):
     box-shadow: 0 4px 8px rgba(0,0,0,0.1);
     }
 
-    .floating-logout-btn:hover {
+    .st-key-floating_logout .stButton > button:hover {
         transform: translateY(-5px) scale(1.1) !important;
         box-shadow: 0 0 40px rgba(220, 38, 38, 0.9), 0 10px 30px rgba(220, 38, 38, 0.6) !important;
         background: linear-gradient(135deg, #ef4444, #dc2626) !important;
@@ -444,39 +450,11 @@ def render_unified_header(user_data):
 
 def render_floating_logout():
     """Render floating logout button in bottom right with enhanced glow"""
-    logout_js = """
-    <div style="position: fixed; bottom: 30px; right: 30px; z-index: 1000;">
-        <button class="floating-logout-btn" onclick="logoutUser()" title="Logout">
-            🚪
-        </button>
-    </div>
-    <script>
-    function logoutUser() {
-        const logoutBtn = document.querySelector('button[data-testid="logout-btn"]');
-        if (logoutBtn) {
-            logoutBtn.click();
-        }
-    }
-    </script>
-    """
-
-def render_floating_logout():
-    """Render floating logout button in bottom right with enhanced glow"""
-    logout_js = """
-    <div style="position: fixed; bottom: 30px; right: 30px; z-index: 1000;">
-        <button class="floating-logout-btn" onclick="logoutUser()" title="Logout">
-            🚪
-        </button>
-    </div>
-    <script>
-    function logoutUser() {
-        const logoutBtn = document.querySelector('button[data-testid="logout-btn"]');
-        if (logoutBtn) {
-            logoutBtn.click();
-        }
-    }
-    </script>
-    """
+    # A keyed container gets the st-key-floating_logout class, which pins it to the corner
+    with st.container(key="floating_logout"):
+        if st.button("🚪", key="logout_btn", help="Logout"):
+            logout()
+            st.rerun()
 def get_image_base64(image_path):
     """Load image and convert to base64"""
     try:
@@ -556,20 +534,27 @@ def render_externals_modal():
     # Close the grid
     st.markdown('</div>', unsafe_allow_html=True)
     st.markdown("<br><br>", unsafe_allow_html=True)
+# ---- PAGE REGISTRY ----
+# page -> (module, render function); a module is imported the first time its page is shown,
+# so the login screen never waits for the chat or profile modules. None means this module.
+PAGES = {
+    'chatroom': ('chat_interface', 'render_chat_interface'),
+    'history': (None, 'render_chat_history_page'),
+    'profile': ('profile_manager', 'render_profile_manager'),
+    'analytics': (None, 'render_analytics_page'),
+    'career': (None, 'render_career_page'),
+}
+DEFAULT_PAGE = 'chatroom'
+
+def get_page_renderer(page):
+    """Render function for a page, importing its module on first use"""
+    module_name, function_name = PAGES.get(page, PAGES[DEFAULT_PAGE])
+    namespace = vars(importlib.import_module(module_name)) if module_name else globals()
+    return namespace[function_name]
+
 def render_main_content(user_data):
-    current_page = st.session_state.get('current_page', 'chatroom')
-    if current_page == 'chatroom':
-        render_chat_interface(user_data)
-    elif current_page == 'history':
-        render_chat_history_page(user_data)
-    elif current_page == 'profile':
-        render_profile_manager(user_data)
-    elif current_page == 'analytics':
-        render_analytics_page(user_data)
-    elif current_page == 'career':
-        render_career_page(user_data)
-    else:
-        render_chat_interface(user_data)
+    current_page = st.session_state.get('current_page', DEFAULT_PAGE)
+    get_page_renderer(current_page)(user_data)
 
 def render_chat_history_page(user_data):
     st.markdown("""
@@ -645,10 +630,10 @@ def render_chat_history_page(user_data):
                     st.markdown(f'''
                     <div class="conversation-card">
                         <strong>You:</strong>
-                        <div class="conversation-preview">{user_msg['content']}</div>
+                        <div class="conversation-preview">{message_html(user_msg)}</div>
                         <br>
                         <strong>Zyra:</strong>
-                        <div class="conversation-preview">{bot_msg['content']}</div>
+                        <div class="conversation-preview">{message_html(bot_msg)}</div>
                         <div class="conversation-time">
                             {format_timestamp(user_msg.get('timestamp', ''))}
                         </div>
@@ -0,0 +1,90 @@
+"""
+Chat message rendering for Zyra
+Markdown is turned into HTML once, when a message is stored; everything the user or the model wrote is escaped first
+"""
+import html
+import re
+
+_FENCE = re.compile(r"^\s*```")
+_HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+_BULLET = re.compile(r"^\s*[-*+•]\s+(.*)$")
+_NUMBERED = re.compile(r"^\s*\d+[.)]\s+(.*)$")
+_CODE = re.compile(r"`([^`\n]+)`")
+_BOLD = re.compile(r"\*\*(?=\S)(.+?)(?<=\S)\*\*|__(?=\S)(.+?)(?<=\S)__")
+_ITALIC = re.compile(r"(?<![\w*])\*(?=[^\s*])(.+?)(?<=[^\s*])\*(?![\w*])|(?<![\w_])_(?=\S)(.+?)(?<=\S)_(?![\w_])")
+_LINK = re.compile(r"\[([^\]]+)\]\((https?://[^\s()]+)\)")
+
+
+def _inline(text):
+    """Escape one line and apply emphasis, code spans and http(s) links"""
+    parts = _CODE.split(html.escape(text))
+    for i, part in enumerate(parts):
+        if i % 2:
+            parts[i] = f"<code>{part}</code>"
+            continue
+        part = _LINK.sub(r'<a href="\2" target="_blank" rel="noopener noreferrer">\1</a>', part)
+        part = _BOLD.sub(lambda m: f"<strong>{m.group(1) or m.group(2)}</strong>", part)
+        parts[i] = _ITALIC.sub(lambda m: f"<em>{m.group(1) or m.group(2)}</em>", part)
+    return "".join(parts)
+
+
+def render_markdown(text):
+    """
+    Sanitized HTML for a chat message: paragraphs, headings, lists, code, emphasis and links.
+    The output contains no raw newlines, so it stays a single HTML block inside st.markdown.
+    """
+    blocks = []
+    paragraph, items, list_tag, code = [], [], None, None
+
+    def flush():
+        nonlocal list_tag
+        if paragraph:
+            blocks.append(f"<p>{'<br>'.join(paragraph)}</p>")
+            paragraph.clear()
+        if items:
+            blocks.append(f"<{list_tag}>{''.join(f'<li>{item}</li>' for item in items)}</{list_tag}>")
+            items.clear()
+            list_tag = None
+
+    for line in (text or "").splitlines():
+        if code is not None:
+            if _FENCE.match(line):
+                blocks.append(f"<pre><code>{'&#10;'.join(code)}</code></pre>")
+                code = None
+            else:
+                code.append(html.escape(line))
+            continue
+        if _FENCE.match(line):
+            flush()
+            code = []
+            continue
+        heading, bullet, numbered = _HEADING.match(line), _BULLET.match(line), _NUMBERED.match(line)
+        if not line.strip():
+            flush()
+        elif heading:
+            flush()
+            level = min(6, len(heading.group(1)) + 2)
+            blocks.append(f"<h{level}>{_inline(heading.group(2))}</h{level}>")
+        elif bullet or numbered:
+            tag = 'ul' if bullet else 'ol'
+            if paragraph or list_tag != tag:
+                flush()
+            list_tag = tag
+            items.append(_inline((bullet or numbered).group(1)))
+        elif items and line.startswith((" ", "\t")):
+            # Continuation of the previous list item
+            items[-1] += f"<br>{_inline(line.strip())}"
+        else:
+            if items:
+                flush()
+            paragraph.append(_inline(line.strip()))
+    if code is not None:
+        blocks.append(f"<pre><code>{'&#10;'.join(code)}</code></pre>")
+    flush()
+    return "".join(blocks)
+
+
+def message_html(message):
+    """The stored fragment of a message, rendered on the spot for messages saved before fragments existed"""
+    return message.get('html') or render_markdown(message.get('content', ''))
+
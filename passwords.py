@@ -0,0 +1,73 @@
+"""
+Password hashing for Zyra accounts
+Salted scrypt hashes computed on a bounded worker pool, with legacy SHA-256 hashes verified and upgraded
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ---- CONFIG ----
+# scrypt cost: N (CPU/memory, power of two), r (block size), p (parallelism); ~16 MB and ~50 ms per hash by default
+SCRYPT_N = int(os.environ.get("ZYRA_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.environ.get("ZYRA_SCRYPT_R", "8"))
+SCRYPT_P = int(os.environ.get("ZYRA_SCRYPT_P", "1"))
+# Threads that may hash at once; further logins queue instead of competing for every core
+HASH_WORKERS = int(os.environ.get("ZYRA_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="zyra-kdf")
+    return _executor
+
+
+def _scrypt(password, salt, n, r, p, dklen=KEY_BYTES):
+    # hashlib.scrypt releases the GIL, so the pool threads hash in parallel with script threads
+    return hashlib.scrypt(
+        password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+        maxmem=max(32 * 1024 * 1024, 256 * n * r * p), dklen=dklen,
+    )
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def hash_password(password, n=None, r=None, p=None):
+    """Return a salted scrypt hash string ("scrypt$n$r$p$salt$key") computed on the hashing pool"""
+    n, r, p = n or SCRYPT_N, r or SCRYPT_R, p or SCRYPT_P
+    salt = os.urandom(SALT_BYTES)
+    key = _get_executor().submit(_scrypt, password, salt, n, r, p).result()
+    return f"scrypt${n}${r}${p}${_b64(salt)}${_b64(key)}"
+
+
+def verify_password(password, stored_hash):
+    """
+    Check a password against a stored hash. Returns (matches, needs_rehash); needs_rehash
+    is set for legacy SHA-256 hashes and for scrypt hashes made with other cost settings.
+    """
+    if not stored_hash:
+        return False, False
+    if not stored_hash.startswith("scrypt$"):
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored_hash), True
+    try:
+        _, n, r, p, salt, key = stored_hash.split("$")
+        n, r, p = int(n), int(r), int(p)
+        salt, key = base64.b64decode(salt), base64.b64decode(key)
+    except ValueError:
+        return False, False
+    candidate = _get_executor().submit(_scrypt, password, salt, n, r, p, len(key)).result()
+    matches = hmac.compare_digest(candidate, key)
+    return matches, matches and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
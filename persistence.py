@@ -0,0 +1,180 @@
+"""
+Dirty tracking and write-behind persistence for Zyra user documents
+Unchanged documents are never written and background saves are coalesced per user
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from user_store import copy_document, safe_username
+
+# ---- CONFIG ----
+# Longest a deferred save may wait before it reaches the store
+WRITE_BEHIND_DELAY = float(os.environ.get("ZYRA_WRITE_BEHIND_DELAY", "2.0"))
+# Minimum seconds between two persisted last_active updates
+LAST_ACTIVE_INTERVAL = float(os.environ.get("ZYRA_LAST_ACTIVE_INTERVAL", "300"))
+
+logger = logging.getLogger(__name__)
+
+
+# ---- CHANGE TRACKING ----
+class TrackedUserData(dict):
+    """User document that remembers its last persisted state and reports which fields changed"""
+
+    def __init__(self, user_data):
+        super().__init__(user_data)
+        self.mark_clean()
+
+    def mark_clean(self):
+        """Take the current contents as the persisted baseline"""
+        self._baseline = copy_document(self)
+
+    @property
+    def baseline(self):
+        """The document as last loaded or saved; the base for merging concurrent changes"""
+        return self._baseline
+
+    def adopt(self, saved):
+        """Replace the contents with the document as the store wrote it (new version, merged fields)"""
+        if saved is not self:
+            self.clear()
+            self.update(copy_document(saved))
+        self.mark_clean()
+
+    def changed_fields(self):
+        """Top-level fields that differ from the baseline (chat_history by length and last message)"""
+        changed = {k for k, v in self.items() if k != 'chat_history' and self._baseline.get(k, _MISSING) != v}
+        changed.update(k for k in self._baseline if k not in self)
+        chat_history = self.get('chat_history') or []
+        base_history = self._baseline.get('chat_history') or []
+        if len(chat_history) != len(base_history) or (chat_history and chat_history[-1] is not base_history[-1]):
+            changed.add('chat_history')
+        return changed
+
+    def is_dirty(self):
+        return bool(self.changed_fields())
+
+
+_MISSING = object()
+
+
+def touch_last_active(user_data, now=None):
+    """Refresh last_active at most once per LAST_ACTIVE_INTERVAL so idle reruns stay clean"""
+    now = now or datetime.now()
+    try:
+        last = datetime.fromisoformat(user_data.get('last_active', ''))
+        if (now - last).total_seconds() < LAST_ACTIVE_INTERVAL:
+            return False
+    except (TypeError, ValueError):
+        pass
+    user_data['last_active'] = now.isoformat()
+    return True
+
+
+# ---- WRITE-BEHIND QUEUE ----
+class WriteBehindQueue:
+    """
+    Coalesces deferred saves per user session and writes them from a background thread.
+    A save waits at most `delay` seconds after it was first scheduled. Entries are only
+    taken out of the queue while holding the user's store lock, so a queued snapshot and
+    a synchronous save from the same session can never be written out of order.
+    """
+
+    def __init__(self, store, delay=WRITE_BEHIND_DELAY):
+        self.store = store
+        self.delay = delay
+        self._pending = {}  # (username, session) -> [snapshot, due time, merge base]
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="zyra-write-behind", daemon=True)
+        self._thread.start()
+
+    def schedule(self, username, user_data, session=None):
+        """Queue a snapshot of the document; later snapshots replace earlier ones but keep the deadline and base"""
+        key = (safe_username(username), session)
+        with self._cond:
+            entry = self._pending.get(key)
+            if entry:
+                entry[0] = copy_document(user_data)
+            else:
+                self._pending[key] = [copy_document(user_data), time.monotonic() + self.delay, _base_of(user_data)]
+                self._cond.notify()
+
+    def save_now(self, username, user_data, session=None):
+        """Write synchronously, superseding the session's queued save; returns the written document"""
+        key = (safe_username(username), session)
+        with self.store.user_lock(username):
+            with self._cond:
+                entry = self._pending.pop(key, None)
+            # A superseded snapshot's changes are part of user_data, so merge from its older base
+            base = entry[2] if entry else _base_of(user_data)
+            return self.store.save(username, user_data, base)
+
+    def pending(self, username, session=None):
+        """Most recent unwritten snapshot the session queued for a user, if any"""
+        with self._cond:
+            entry = self._pending.get((safe_username(username), session))
+            return copy_document(entry[0]) if entry else None
+
+    def flush(self):
+        """Write everything that is queued right now"""
+        with self._cond:
+            keys = list(self._pending)
+        for key in keys:
+            self._write(key)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                now = time.monotonic()
+                due = [key for key, entry in self._pending.items() if entry[1] <= now]
+                if not due:
+                    self._cond.wait(min(entry[1] for entry in self._pending.values()) - now)
+                    continue
+            for key in due:
+                self._write(key)
+
+    def _write(self, key):
+        username = key[0]
+        with self.store.user_lock(username):
+            with self._cond:
+                entry = self._pending.pop(key, None)
+            if entry is None:
+                # A synchronous save already took it
+                return
+            try:
+                self.store.save(username, entry[0], entry[2])
+            except Exception:
+                logger.exception("Deferred save failed for %s; retrying", username)
+                with self._cond:
+                    newer = self._pending.get(key)
+                    if newer:
+                        # The newer snapshot still has to merge from this older base
+                        newer[2] = entry[2]
+                    else:
+                        entry[1] = time.monotonic() + self.delay
+                        self._pending[key] = entry
+                        self._cond.notify()
+
+
+def _base_of(user_data):
+    return user_data.baseline if isinstance(user_data, TrackedUserData) else None
+
+
+_queues = {}
+_queue_lock = threading.Lock()
+
+
+def get_write_behind(store):
+    """Return the process-wide write-behind queue for a store, flushed on interpreter exit"""
+    queue = _queues.get(id(store))
+    if queue is None:
+        with _queue_lock:
+            queue = _queues.get(id(store))
+            if queue is None:
+                queue = _queues[id(store)] = WriteBehindQueue(store)
+                atexit.register(queue.flush)
+    return queue
@@ -3,10 +3,10 @@ Designed Profile Management Module for Zyra AI Personalized Career Advisor
 Clean, modern profile interface with better organization and visual hierarchy
 """
 import streamlit as st
-import plotly.graph_objects as go
-import plotly.express as px
 from datetime import datetime
 from auth_landing import save_user_data, load_user_data
+from user_schema import compute_profile_completion
+from prompt_context import invalidate_profile_fragment
 
 def load_profile_css():
     """Modern CSS styles for profile management interface"""
@@ -402,22 +402,14 @@ def render_basic_info_tab(user_data):
             user_data['profile']['goal'] = new_goal
             
             # Update completion percentage
-            fields_completed = sum([
-                bool(new_name.strip()),
-                bool(new_role),
-                bool(new_location.strip()),
-                bool(new_education.strip()),
-                bool(new_bio.strip()),
-                bool(new_goal.strip()),
-                bool(user_data['profile']['interests'])
-            ])
-            user_data['profile']['completion'] = min(90, int((fields_completed / 7) * 100))
+            user_data['profile']['completion'] = compute_profile_completion(user_data['profile'])
             
             # Award profile completion badges
             if user_data['profile']['completion'] >= 70 and "Profile Pro" not in user_data.get('badges', []):
                 user_data.setdefault('badges', []).append("Profile Pro")
                 user_data['xp'] = user_data.get('xp', 0) + 50
             
+            invalidate_profile_fragment(st.session_state.username)
             save_user_data(st.session_state.username, user_data)
             st.success("Profile updated successfully!")
             st.rerun()
@@ -491,6 +483,7 @@ def render_skills_tab(user_data):
             
             if st.form_submit_button("Update Technical Skills", type="primary"):
                 user_data['skills']['technical'] = updated_skills
+                invalidate_profile_fragment(st.session_state.username)
                 save_user_data(st.session_state.username, user_data)
                 st.success("Technical skills updated!")
                 st.rerun()
@@ -557,6 +550,7 @@ def render_skills_tab(user_data):
             
             if st.form_submit_button("Update Soft Skills", type="primary"):
                 user_data['skills']['soft'] = updated_soft_skills
+                invalidate_profile_fragment(st.session_state.username)
                 save_user_data(st.session_state.username, user_data)
                 st.success("Soft skills updated!")
                 st.rerun()
@@ -589,6 +583,7 @@ def render_goals_tab(user_data):
         
         if st.form_submit_button("Update Interests", type="primary"):
             user_data['profile']['interests'] = selected_interests
+            invalidate_profile_fragment(st.session_state.username)
             save_user_data(st.session_state.username, user_data)
             st.success("Interests updated!")
             st.rerun()
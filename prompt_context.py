@@ -0,0 +1,83 @@
+"""
+Prompt context fragments for Zyra's career advisor
+The rendered profile/skills preamble is cached per user and only rebuilt after profile or skill edits
+"""
+import os
+import threading
+from collections import OrderedDict
+from conversation_memory import estimate_tokens, format_memory, truncate_message
+from user_store import safe_username
+
+# ---- CONFIG ----
+# Estimated tokens one prompt may use; conversation memory is trimmed first to stay under it
+PROMPT_TOKEN_LIMIT = int(os.environ.get("ZYRA_PROMPT_TOKEN_LIMIT", "3000"))
+# Users whose rendered fragment is kept in memory
+FRAGMENT_CACHE_SIZE = int(os.environ.get("ZYRA_FRAGMENT_CACHE_SIZE", "10000"))
+
+_fragments = OrderedDict()  # username -> (fragment, estimated tokens)
+_fragments_lock = threading.Lock()
+
+
+def render_profile_fragment(user_data):
+    """The part of the prompt that describes who the user is"""
+    profile = user_data.get('profile', {})
+    skills = user_data.get('skills', {})
+    technical = ', '.join([f"{skill} ({level}%)" for skill, level in skills.get('technical', {}).items() if level > 0])
+    soft = ', '.join([f"{skill} ({level}%)" for skill, level in skills.get('soft', {}).items() if level > 50])
+    return f"""You're currently helping {profile.get('name', 'User')}, who has the following profile:
+
+PROFILE INFORMATION:
+- Current Role: {profile.get('current_role', 'Student')}
+- Experience Level: {profile.get('experience_level', 'Beginner')}
+- Location: {profile.get('location', 'India')}
+- Education: {profile.get('education', 'Not specified')}
+- Career Goal: {profile.get('goal', 'Professional growth')}
+- Interests: {', '.join(profile.get('interests', ['General career development']))}
+
+CURRENT SKILLS:
+Technical Skills: {technical or 'None specified'}
+Soft Skills: {soft or 'Basic communication skills'}"""
+
+
+def get_profile_fragment(username, user_data):
+    """Cached (fragment, estimated tokens) for a user, rendered on first use after an invalidation"""
+    key = safe_username(username)
+    with _fragments_lock:
+        entry = _fragments.get(key)
+        if entry is not None:
+            _fragments.move_to_end(key)
+            return entry
+    fragment = render_profile_fragment(user_data)
+    entry = (fragment, estimate_tokens(fragment))
+    with _fragments_lock:
+        _fragments[key] = entry
+        while len(_fragments) > FRAGMENT_CACHE_SIZE:
+            _fragments.popitem(last=False)
+    return entry
+
+
+def invalidate_profile_fragment(username):
+    """Forget a user's fragment; call whenever their profile or skills change"""
+    with _fragments_lock:
+        _fragments.pop(safe_username(username), None)
+
+
+def fit_to_budget(summary, recent, max_tokens):
+    """
+    Memory prompt section within max_tokens. Summary lines are dropped first, then the oldest
+    recent messages, so headers stay with their content; the newest message is shortened, not dropped.
+    """
+    if max_tokens <= 0:
+        return ""
+    lines, recent = summary.splitlines() if summary else [], list(recent)
+    text = format_memory(summary, recent)
+    while estimate_tokens(text) > max_tokens and (lines or len(recent) > 1):
+        if lines:
+            lines.pop(0)
+        else:
+            recent.pop(0)
+        text = format_memory("\n".join(lines), recent)
+    if estimate_tokens(text) > max_tokens and recent:
+        framing = estimate_tokens(format_memory("", [dict(recent[0], content="")]))
+        text = format_memory("", [truncate_message(recent[0], max_tokens - framing)])
+    return text
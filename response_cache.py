@@ -0,0 +1,224 @@
+"""
+Response cache for Zyra's career advisor
+Replies keyed by the normalized question plus a fingerprint of the profile fields the prompt uses
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# ---- CONFIG ----
+RESPONSE_CACHE_TTL = float(os.environ.get("ZYRA_RESPONSE_CACHE_TTL", str(24 * 60 * 60)))
+RESPONSE_CACHE_SIZE = int(os.environ.get("ZYRA_RESPONSE_CACHE_SIZE", "2000"))
+# SQLite file for a second tier that survives restarts; empty keeps the cache in memory only
+RESPONSE_CACHE_PATH = os.environ.get("ZYRA_RESPONSE_CACHE_PATH", "")
+# Replies kept in the SQLite tier; the least recently used are evicted beyond this (checked every 100 writes)
+RESPONSE_CACHE_DISK_SIZE = int(os.environ.get("ZYRA_RESPONSE_CACHE_DISK_SIZE", "20000"))
+# Disk writes between two passes that drop expired replies and enforce the size cap
+_PRUNE_EVERY = 100
+
+# Stand in for the user's full and first name in stored replies, so one answer serves users who differ only by name
+_NAME_PLACEHOLDER = "\x00name\x00"
+_FIRST_NAME_PLACEHOLDER = "\x00first\x00"
+# Words that address the user by name at the start of a reply
+_GREETING = r"(?:hi|hello|hey|dear|namaste|welcome|thanks|thank you|congrats|congratulations)"
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question):
+    """Case, punctuation and spacing insensitive form of a question"""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", question.lower())).strip()
+
+
+def profile_fingerprint(user_data):
+    """Hash of everything create_ai_context puts in the prompt apart from the name and the question"""
+    profile = user_data.get('profile', {})
+    skills = user_data.get('skills', {})
+    fields = {
+        'role': profile.get('current_role', 'Student'),
+        'experience': profile.get('experience_level', 'Beginner'),
+        'location': profile.get('location', 'India'),
+        'education': profile.get('education', 'Not specified'),
+        'goal': profile.get('goal', 'Professional growth'),
+        'interests': profile.get('interests', []),
+        'technical': sorted((skill, level) for skill, level in skills.get('technical', {}).items() if level > 0),
+        'soft': sorted((skill, level) for skill, level in skills.get('soft', {}).items() if level > 50),
+    }
+    return hashlib.sha1(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def make_key(question, user_data, context=""):
+    """Cache key for a question asked with this profile (and optional extra prompt context)"""
+    parts = [normalize_question(question), profile_fingerprint(user_data)]
+    if context:
+        parts.append(hashlib.sha1(context.encode('utf-8')).hexdigest())
+    return hashlib.sha1("\n".join(parts).encode('utf-8')).hexdigest()
+
+
+def _name_tokens(name):
+    return [token for token in re.split(r"[^\w'-]+", name or "") if token]
+
+
+def _word(text, flags=0):
+    return re.compile(rf"(?<![\w'-]){re.escape(text)}(?![\w'-])", flags)
+
+
+def _addressed(text):
+    """
+    text where it addresses the user: after a greeting or opening the reply and followed by "," or "!"
+    ("Hi Asha,", "Asha, here's"), or closing a sentence after a comma ("Good luck, Asha!")
+    """
+    name = re.escape(text)
+    return re.compile(
+        rf"((?i:\b{_GREETING})[ \t]+|^[ \t]*)({name})(?=[ \t]*[,!])|(,[ \t]+)({name})(?=[.!?](?:\s|$))"
+    )
+
+
+def _replace_addressed(text, reply, placeholder):
+    return _addressed(text).sub(lambda m: (m.group(1) if m.group(2) else m.group(3)) + placeholder, reply)
+
+
+def name_template(reply, name):
+    """
+    reply with the full and first name replaced by placeholders where they address the user, or None
+    when any part of the name is still in it. Names that are also ordinary words ("Career") are then
+    only shared when every use is a greeting.
+    """
+    tokens = _name_tokens(name)
+    if not tokens:
+        return reply
+    template = reply
+    if len(tokens) > 1:
+        template = _replace_addressed(" ".join(tokens), template, _NAME_PLACEHOLDER)
+    template = _replace_addressed(tokens[0], template, _FIRST_NAME_PLACEHOLDER)
+    if any(_word(token, re.IGNORECASE).search(template) for token in tokens):
+        return None
+    return template
+
+
+def _personalise(template, name):
+    tokens = _name_tokens(name)
+    return template.replace(_NAME_PLACEHOLDER, " ".join(tokens) or "there").replace(
+        _FIRST_NAME_PLACEHOLDER, tokens[0] if tokens else "there"
+    )
+
+
+class ResponseCache:
+    """LRU of replies with a TTL, optionally backed by a size-capped SQLite file that outlives the process"""
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_SIZE, path=RESPONSE_CACHE_PATH,
+                 max_disk_entries=RESPONSE_CACHE_DISK_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()  # key -> (expires at, reply template)
+        self._lock = threading.Lock()
+        self._db = None
+        self._disk_writes = 0
+        if path:
+            self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, reply TEXT NOT NULL, expires REAL NOT NULL,"
+                " used REAL NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(responses)")}
+            if 'used' not in columns:
+                # Files written before the size cap existed
+                self._db.execute("ALTER TABLE responses ADD COLUMN used REAL NOT NULL DEFAULT 0")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used)")
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+
+    def get(self, key, name=""):
+        """Cached reply for key personalised with name, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT expires, reply FROM responses WHERE key = ? AND expires > ?", (key, now)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1])
+                    self._remember(key, entry)
+                    self._db.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+                    self.disk_hits += 1
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return _personalise(entry[1], name)
+
+    def put(self, key, reply, name=""):
+        """Cache reply unless it would carry part of name to another user; returns whether it was cached"""
+        template = name_template(reply, name)
+        if template is None:
+            with self._lock:
+                self.uncacheable += 1
+            return False
+        now = time.time()
+        entry = (now + self.ttl, template)
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, reply, expires, used) VALUES (?, ?, ?, ?)",
+                    (key, template, entry[0], now),
+                )
+                self._disk_writes += 1
+                if self._disk_writes % _PRUNE_EVERY == 0:
+                    self._prune_disk(now)
+        return True
+
+    def _prune_disk(self, now):
+        self._db.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_disk_entries:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY used LIMIT ?)",
+                (count - self.max_disk_entries,),
+            )
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'uncacheable': self.uncacheable,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide response cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
@@ -0,0 +1,95 @@
+"""
+Signed session tokens for Zyra
+Lets a browser reload resume the session without logging in again; tokens expire and can be revoked
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+
+# ---- CONFIG ----
+# Seconds a session token stays valid after login
+SESSION_TTL = int(os.environ.get("ZYRA_SESSION_TTL", str(7 * 24 * 60 * 60)))
+# Signing key; without one, a random key is used and sessions end when the server restarts
+SESSION_SECRET = os.environ.get("ZYRA_SESSION_SECRET", "")
+
+logger = logging.getLogger(__name__)
+
+_key = None
+_revoked = {}  # token id -> expiry, kept until the token would have expired anyway
+_revoked_lock = threading.Lock()
+
+
+def _signing_key():
+    global _key
+    if _key is None:
+        if SESSION_SECRET:
+            _key = SESSION_SECRET.encode('utf-8')
+        else:
+            logger.warning("ZYRA_SESSION_SECRET is not set; session tokens will not survive a restart")
+            _key = secrets.token_bytes(32)
+    return _key
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload):
+    return _b64encode(hmac.new(_signing_key(), payload.encode('ascii'), hashlib.sha256).digest())
+
+
+def issue_token(username, ttl=SESSION_TTL):
+    """Create a signed token for username that expires after ttl seconds"""
+    claims = {'u': username, 'exp': int(time.time()) + ttl, 'id': secrets.token_hex(8)}
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+    return f"{payload}.{_sign(payload)}"
+
+
+def _claims(token):
+    """Claims of a well-signed, unexpired token, or None"""
+    if not token or token.count(".") != 1:
+        return None
+    payload, signature = token.split(".")
+    try:
+        if not hmac.compare_digest(signature.encode('ascii'), _sign(payload).encode('ascii')):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        # Non-ASCII or malformed token text
+        return None
+    if not isinstance(claims, dict) or claims.get('exp', 0) <= time.time():
+        return None
+    return claims
+
+
+def verify_token(token):
+    """Return the username a token was issued to, or None if it is invalid, expired or revoked"""
+    claims = _claims(token)
+    if claims is None:
+        return None
+    with _revoked_lock:
+        if claims.get('id') in _revoked:
+            return None
+    return claims.get('u')
+
+
+def revoke_token(token):
+    """Invalidate a token (e.g. on logout) for the rest of its lifetime"""
+    claims = _claims(token)
+    if claims is None:
+        return
+    now = time.time()
+    with _revoked_lock:
+        for token_id in [token_id for token_id, expiry in _revoked.items() if expiry <= now]:
+            del _revoked[token_id]
+        _revoked[claims['id']] = claims['exp']
@@ -3,6 +3,7 @@ Clean Navigation Bar Components for Zyra AI Career Advisor
 Simple navigation with external links and basic functionality
 """
 import streamlit as st
+import html
 import time
 from datetime import datetime
 from auth_landing import save_users, load_users
@@ -197,10 +198,12 @@ def render_sidebar(user_data, users):
             recent_chats = user_messages[-5:]  # Last 5 user messages
             
             for i, chat in enumerate(reversed(recent_chats)):
-                chat_preview = chat['content'][:30] + "..." if len(chat['content']) > 30 else chat['content']
+                # Plain text on one line, escaped; the stored HTML fragment cannot be cut at 30 characters
+                chat_text = " ".join(chat['content'].split())
+                chat_preview = chat_text[:30] + "..." if len(chat_text) > 30 else chat_text
                 st.markdown(f'''
-                <div class="chat-item" title="{chat['content']}">
-                    💬 {chat_preview}
+                <div class="chat-item" title="{html.escape(chat_text)}">
+                    💬 {html.escape(chat_preview)}
                 </div>
                 ''', unsafe_allow_html=True)
             
@@ -0,0 +1,36 @@
+"""
+Compact serialization codec for Zyra user documents and chat log records
+Uses orjson when it is installed and falls back to the standard library
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+CODEC_NAME = "orjson" if orjson else "json"
+
+
+def encode(value):
+    """Serialize to compact UTF-8 JSON bytes (no indentation, non-ASCII kept as-is)"""
+    if orjson:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def encode_line(value):
+    """Serialize one newline-terminated record for an append-only log"""
+    return encode(value) + b"\n"
+
+
+def decode(data):
+    """Parse JSON bytes or text; legacy indented documents decode the same way"""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_text(value):
+    """Compact JSON as str, for text columns"""
+    return encode(value).decode('utf-8')
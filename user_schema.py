@@ -0,0 +1,198 @@
+"""
+User document schema for Zyra AI Career Advisor
+Defaults for new users, derived fields (level, profile completion) and validation/migration
+"""
+from datetime import datetime
+
+XP_PER_LEVEL = 200
+MESSAGE_SENDERS = ('user', 'bot')
+GOAL_BUCKETS = ('short_term', 'long_term', 'completed')
+
+
+def init_user_data(username):
+    """Initialize clean user data structure"""
+    user_data = {
+        'username': username,
+        'password': '',
+        'created_at': datetime.now().isoformat(),
+        'profile': {
+            'name': username.title(),
+            'current_role': 'Student',
+            'experience_level': 'Beginner',
+            'location': '',
+            'education': '',
+            'preferred_work_type': 'Remote',
+            'availability': 'Learning and growing',
+            'bio': '',
+            'goal': '',
+            'interests': [],
+            'completion': 0
+        },
+        'skills': {
+            'technical': {
+                'Python': 0,
+                'JavaScript': 0,
+                'HTML/CSS': 0,
+                'SQL': 0,
+                'React': 0,
+                'Machine Learning': 0
+            },
+            'soft': {
+                'Communication': 50,
+                'Teamwork': 50,
+                'Problem Solving': 50,
+                'Leadership': 30,
+                'Time Management': 40,
+                'Adaptability': 45
+            }
+        },
+        'goals_tracking': {
+            'short_term': [],
+            'long_term': [],
+            'completed': []
+        },
+        'chat_history': [],
+        'memory': {
+            'summary': '',
+            'summarized_upto': 0
+        },
+        'xp': 0,
+        'level': 1,
+        'badges': ['New Member'],
+        'streak': 1,
+        'last_active': datetime.now().isoformat()
+    }
+    # Derived the same way migration recomputes it, so a fresh document migrates without changes
+    user_data['profile']['completion'] = compute_profile_completion(user_data['profile'])
+    return user_data
+
+
+# ---- DERIVED FIELDS ----
+def compute_level(xp):
+    """Level shown on the dashboard for an XP total"""
+    return max(1, xp // XP_PER_LEVEL)
+
+
+def compute_profile_completion(profile):
+    """Profile completion percentage from the fields the Basic Info form collects"""
+    fields_completed = sum([
+        bool(str(profile.get('name', '')).strip()),
+        bool(profile.get('current_role')),
+        bool(str(profile.get('location', '')).strip()),
+        bool(str(profile.get('education', '')).strip()),
+        bool(str(profile.get('bio', '')).strip()),
+        bool(str(profile.get('goal', '')).strip()),
+        bool(profile.get('interests'))
+    ])
+    return min(90, int((fields_completed / 7) * 100))
+
+
+# ---- VALIDATION & MIGRATION ----
+def validate_user_data(user_data):
+    """Return a list of human-readable schema problems (empty when the document is valid)"""
+    problems = []
+    defaults = init_user_data(user_data.get('username', '') if isinstance(user_data, dict) else '')
+    if not isinstance(user_data, dict):
+        return ["document is not an object"]
+    for key, default in defaults.items():
+        if key not in user_data:
+            problems.append(f"missing field '{key}'")
+        elif not isinstance(user_data[key], type(default)):
+            problems.append(f"'{key}' should be {type(default).__name__}, got {type(user_data[key]).__name__}")
+    for category, skills in (user_data.get('skills') or {}).items():
+        if not isinstance(skills, dict):
+            problems.append(f"skills '{category}' should be an object")
+            continue
+        for skill, level in skills.items():
+            if not isinstance(level, int) or not 0 <= level <= 100:
+                problems.append(f"skill '{skill}' has invalid level {level!r}")
+    goals = user_data.get('goals_tracking')
+    if isinstance(goals, dict):
+        for bucket in GOAL_BUCKETS:
+            for goal in goals.get(bucket) or []:
+                if not isinstance(goal, dict) or 'goal' not in goal:
+                    problems.append(f"malformed goal in '{bucket}'")
+    for i, message in enumerate(user_data.get('chat_history') or []):
+        if not isinstance(message, dict) or message.get('sender') not in MESSAGE_SENDERS \
+                or not isinstance(message.get('content'), str):
+            problems.append(f"malformed chat message #{i}")
+    return problems
+
+
+def migrate_user_data(user_data):
+    """
+    Bring an older or damaged document up to the current schema in place and
+    recompute derived fields. Returns the list of changes made.
+    """
+    changes = []
+    defaults = init_user_data(user_data.get('username', ''))
+    for key, default in defaults.items():
+        if key not in user_data or not isinstance(user_data[key], type(default)):
+            coerced = _coerce(user_data.get(key), default)
+            changes.append(f"reset '{key}'" if key in user_data else f"added '{key}'")
+            user_data[key] = coerced
+    for section in ('profile', 'skills', 'goals_tracking'):
+        for key, default in defaults[section].items():
+            if key not in user_data[section]:
+                user_data[section][key] = default
+                changes.append(f"added '{section}.{key}'")
+
+    for category, skills in user_data['skills'].items():
+        if not isinstance(skills, dict):
+            user_data['skills'][category] = defaults['skills'].get(category, {})
+            changes.append(f"reset skills '{category}'")
+            continue
+        for skill, level in skills.items():
+            fixed = min(100, max(0, _coerce(level, 0)))
+            if fixed != level:
+                skills[skill] = fixed
+                changes.append(f"clamped skill '{skill}'")
+
+    for bucket in GOAL_BUCKETS:
+        goals = user_data['goals_tracking'].get(bucket)
+        cleaned = [
+            goal if isinstance(goal, dict) else {'goal': str(goal), 'created_date': user_data['created_at']}
+            for goal in (goals if isinstance(goals, list) else [])
+        ]
+        if cleaned != goals:
+            user_data['goals_tracking'][bucket] = cleaned
+            changes.append(f"repaired goals '{bucket}'")
+
+    messages, repaired = [], 0
+    for message in user_data['chat_history']:
+        if not (isinstance(message, dict) and message.get('sender') in MESSAGE_SENDERS and 'content' in message):
+            continue
+        if not isinstance(message['content'], str):
+            # Messages are replaced, never edited in place, so the save sees it and rewrites the history
+            message = dict(message, content=str(message['content']))
+            repaired += 1
+        messages.append(message)
+    if len(messages) != len(user_data['chat_history']):
+        changes.append(f"dropped {len(user_data['chat_history']) - len(messages)} malformed chat messages")
+    if repaired:
+        changes.append(f"repaired {repaired} chat messages")
+    if len(messages) != len(user_data['chat_history']) or repaired:
+        user_data['chat_history'] = messages
+
+    if user_data['xp'] < 0:
+        user_data['xp'] = 0
+        changes.append("reset negative xp")
+    level = compute_level(user_data['xp'])
+    if user_data['level'] != level:
+        user_data['level'] = level
+        changes.append("recomputed level")
+    completion = compute_profile_completion(user_data['profile'])
+    if user_data['profile'].get('completion') != completion:
+        user_data['profile']['completion'] = completion
+        changes.append("recomputed profile completion")
+    return changes
+
+
+def _coerce(value, default):
+    """Convert value to the type of default, falling back to default"""
+    if isinstance(default, bool) or not isinstance(default, int):
+        return value if isinstance(value, type(default)) else default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
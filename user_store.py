@@ -0,0 +1,1334 @@
+"""
+Pluggable storage backends for Zyra user documents
+JSON files (one per user) or a SQLite database in WAL mode with normalized tables
+"""
+import hashlib
+import logging
+import os
+import queue
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from user_codec import decode, encode, encode_line, encode_text
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - depends on the environment
+    fcntl = None
+
+# ---- CONFIG ----
+STORAGE_BACKEND = os.environ.get("ZYRA_STORAGE_BACKEND", "json").lower()
+SQLITE_PATH = os.environ.get("ZYRA_SQLITE_PATH", "zyra_users.db")
+# Idle SQLite connections kept open for reuse; busier moments open extra ones that are closed afterwards
+SQLITE_POOL_SIZE = int(os.environ.get("ZYRA_SQLITE_POOL_SIZE", "8"))
+# Root of the sharded JSON layout, and the flat directory older versions wrote user_*.json into
+DATA_DIR = os.environ.get("ZYRA_DATA_DIR", "user_data")
+LEGACY_DIR = os.environ.get("ZYRA_LEGACY_DIR", ".")
+# Compact a chat log once it holds more cleared records than this (and more than live ones)
+COMPACT_MIN_DEAD_RECORDS = int(os.environ.get("ZYRA_COMPACT_MIN_DEAD_RECORDS", "200"))
+# Memory budget for parsed user documents shared by every session in the process
+CACHE_MAX_BYTES = int(os.environ.get("ZYRA_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# "Try Demo" accounts: kept in memory only, dropped after DEMO_TTL idle seconds or when over the cap
+DEMO_PREFIX = "demo_user_"
+DEMO_TTL = float(os.environ.get("ZYRA_DEMO_TTL", str(2 * 60 * 60)))
+DEMO_MAX_ACCOUNTS = int(os.environ.get("ZYRA_DEMO_MAX_ACCOUNTS", "500"))
+# How often the background reaper expires demo accounts and removes on-disk demo leftovers
+DEMO_REAP_INTERVAL = float(os.environ.get("ZYRA_DEMO_REAP_INTERVAL", "3600"))
+# When writes reach the disk: "always" fsyncs every write, "batched" group-commits the fsyncs of
+# concurrent writes, "never" leaves it to the OS (writes are still atomic renames)
+FSYNC_POLICY = os.environ.get("ZYRA_FSYNC_POLICY", "batched").lower()
+# How long a group-commit leader waits for other writers to join its fsync batch
+GROUP_COMMIT_WINDOW = float(os.environ.get("ZYRA_GROUP_COMMIT_WINDOW", "0.002"))
+# Compare-and-swap attempts before a save gives up with WriteConflictError
+SAVE_RETRIES = 5
+# Counter fields whose concurrent increments are added together when merging
+_COUNTER_FIELDS = ('xp',)
+
+# Top-level fields that the SQLite backend keeps in dedicated tables/columns
+_USER_COLUMNS = ('password', 'created_at', 'xp', 'level', 'streak', 'last_active')
+_TABLE_FIELDS = ('profile', 'skills', 'goals_tracking', 'badges', 'chat_history')
+_MESSAGE_COLUMNS = ('sender', 'content', 'timestamp')
+# Account fields login needs, kept apart from the (possibly large) user document
+_AUTH_FIELDS = ('password', 'created_at')
+_FSYNC_POLICIES = ('always', 'batched', 'never')
+# SQLite does its own journaling; the policy maps onto its synchronous setting
+_SQLITE_SYNCHRONOUS = {'always': 'FULL', 'batched': 'NORMAL', 'never': 'OFF'}
+
+logger = logging.getLogger(__name__)
+
+
+class WriteConflictError(Exception):
+    """A save kept losing the compare-and-swap race for a user document"""
+
+
+def safe_username(username):
+    """Sanitize a username for use in file names and keys"""
+    return "".join(c for c in username if c.isalnum() or c in ('_', '-')).lower()
+
+
+def clone(value):
+    """Deep copy of the plain dict/list/scalar values user documents are made of"""
+    if isinstance(value, dict):
+        return {k: clone(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [clone(v) for v in value]
+    return value
+
+
+def copy_document(user_data):
+    """Detached copy of a user document; chat messages are never edited in place so they are shared"""
+    return {k: (list(v) if k == 'chat_history' else clone(v)) for k, v in user_data.items()}
+
+
+def auth_fields(user_data):
+    """Credentials and account metadata of a user document"""
+    return {k: user_data.get(k) for k in _AUTH_FIELDS}
+
+
+def estimate_size(value):
+    """Rough in-memory footprint of a user document, used for the cache budget"""
+    if isinstance(value, dict):
+        return 64 + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, list):
+        return 56 + sum(estimate_size(v) for v in value)
+    if isinstance(value, str):
+        return 49 + len(value)
+    return sys.getsizeof(value)
+
+
+def drop_duplicate_messages(chat_history):
+    """
+    chat_history without messages whose id already occurs earlier in it. Message ids double as
+    the idempotency keys of chat submits, so a retried or double-clicked submit is stored once.
+    Returns the list unchanged (the same object) when there is nothing to drop.
+    """
+    seen = set()
+    kept = []
+    for message in chat_history:
+        message_id = message.get('id') if isinstance(message, dict) else None
+        if message_id is not None:
+            if message_id in seen:
+                continue
+            seen.add(message_id)
+        kept.append(message)
+    return kept if len(kept) != len(chat_history) else chat_history
+
+
+# ---- CONFLICT MERGE ----
+def history_edited(base_chat, ours_chat):
+    """Whether ours replaced any message it shares with base; messages are replaced, never edited in place"""
+    return any(a is not b for a, b in zip(base_chat, ours_chat))
+
+
+def merge_documents(base, ours, theirs):
+    """
+    Three-way merge of a session's document (ours) into the stored one (theirs).
+    Fields ours did not touch since base keep their stored value; chat messages
+    ours appended after base are appended to the stored history unless it already has their id.
+    """
+    merged = copy_document(theirs)
+    for key in set(ours) | set(base):
+        if key in ('chat_history', 'version'):
+            continue
+        if key not in ours:
+            if key in base and merged.get(key) == base[key]:
+                merged.pop(key, None)
+            continue
+        if key in base and ours[key] == base[key]:
+            continue
+        merged[key] = _merge_value(key, base.get(key), ours[key], theirs.get(key))
+
+    base_chat = base.get('chat_history') or []
+    ours_chat = ours.get('chat_history') or []
+    if history_edited(base_chat, ours_chat) and len(ours_chat) >= len(base_chat):
+        # Ours repaired messages it loaded; keep them, plus whatever was appended meanwhile
+        merged['chat_history'] = drop_duplicate_messages(
+            list(ours_chat) + list(theirs.get('chat_history') or [])[len(base_chat):]
+        )
+    elif len(ours_chat) >= len(base_chat):
+        merged['chat_history'] = drop_duplicate_messages(
+            list(theirs.get('chat_history') or []) + ours_chat[len(base_chat):]
+        )
+    else:
+        # Ours cleared or trimmed its history; that intent wins
+        merged['chat_history'] = list(ours_chat)
+    return merged
+
+
+def _merge_value(key, base, ours, theirs):
+    if key in _COUNTER_FIELDS and all(isinstance(v, int) for v in (base, ours, theirs)):
+        return theirs + (ours - base)
+    if theirs == base or theirs == ours:
+        return clone(ours)
+    if isinstance(ours, dict) and isinstance(base, dict) and isinstance(theirs, dict):
+        merged = clone(theirs)
+        for k in set(ours) | set(base):
+            if k not in ours:
+                if k in base and merged.get(k) == base[k]:
+                    merged.pop(k, None)
+            elif k not in base or ours[k] != base[k]:
+                merged[k] = _merge_value(k, base.get(k), ours[k], theirs.get(k))
+        return merged
+    if isinstance(ours, list) and isinstance(base, list) and isinstance(theirs, list):
+        if ours[:len(base)] == base:
+            return clone(theirs) + [clone(v) for v in ours[len(base):] if v not in theirs]
+        if theirs[:len(base)] == base:
+            return clone(ours) + [clone(v) for v in theirs[len(base):] if v not in ours]
+    return clone(ours)
+
+
+# ---- DOCUMENT CACHE ----
+class UserDocumentCache:
+    """
+    Process-wide LRU of parsed user documents shared by all Streamlit sessions.
+    Entries are validated against a backend stamp (file stat or row version) on every read.
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (stamp, document, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, stamp):
+        """Return a private copy of the cached document if it is still current"""
+        document = self.peek(key, stamp)
+        return copy_document(document) if document is not None else None
+
+    def peek(self, key, stamp):
+        """Return the shared cached document if it is still current; callers must not modify it"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, stamp, user_data):
+        document = copy_document(user_data)
+        size = estimate_size(document)
+        with self._lock:
+            self._drop(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (stamp, document, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._drop(key)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._bytes -= entry[2]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+class UserStore:
+    """
+    Interface every storage backend implements. Backends provide _load/_save and a
+    cheap _stamp that changes whenever a user's stored data changes; load/save add
+    the shared document cache on top.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else UserDocumentCache()
+        self._locks = {}  # key -> [lock, holders]
+        self._locks_guard = threading.Lock()
+
+    @contextmanager
+    def user_lock(self, username):
+        """Per-user re-entrant lock; entries are dropped once unused so different users never share one"""
+        key = safe_username(username)
+        with self._locks_guard:
+            entry = self._locks.setdefault(key, [threading.RLock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+    def load(self, username):
+        """Return the user document or None if the user does not exist"""
+        with self.user_lock(username):
+            user_data = self._current(username)
+        return copy_document(user_data) if user_data is not None else None
+
+    def _current(self, username):
+        """Stored document through the cache; the result is shared and must not be modified"""
+        key = safe_username(username)
+        # Stamp before reading: a concurrent write can only cause a spurious miss, never a stale hit
+        stamp = self._stamp(username)
+        if stamp is None:
+            return None
+        user_data = self.cache.peek(key, stamp)
+        if user_data is None:
+            user_data = self._load(username)
+            if user_data is not None:
+                self.cache.put(key, stamp, user_data)
+        return user_data
+
+    def save(self, username, user_data, base=None):
+        """
+        Compare-and-swap the document against the version it was loaded at.
+        On conflict it is merged field by field into the stored document when the
+        caller passes the base it started from; without a base the caller's fields win.
+        Chat messages repeating an id that is already in the history are rejected, and a
+        history whose stored messages were replaced is rewritten rather than appended to.
+        Returns the document as written, including its new version.
+        """
+        key = safe_username(username)
+        document = user_data
+        chat_history = user_data.get('chat_history')
+        if isinstance(chat_history, list):
+            unique = drop_duplicate_messages(chat_history)
+            if unique is not chat_history:
+                logger.info("Rejected %d duplicate chat messages for %s", len(chat_history) - len(unique), key)
+                document = dict(user_data, chat_history=unique)
+        rewrite = base is not None and history_edited(
+            base.get('chat_history') or [], document.get('chat_history') or []
+        )
+        with self._writing(username):
+            for _ in range(SAVE_RETRIES):
+                expected = document.get('version', 0)
+                written = dict(document, version=expected + 1)
+                if self._save(username, written, expected, rewrite_history=rewrite):
+                    break
+                current = self._current(username) or {}
+                if base is not None:
+                    document = merge_documents(base, document, current)
+                else:
+                    document = dict(document)
+                document['version'] = current.get('version', 0)
+            else:
+                raise WriteConflictError(f"Could not save {username!r} after {SAVE_RETRIES} attempts")
+            self.cache.invalidate(key)
+            stamp = self._stamp(username)
+            if stamp is not None:
+                self.cache.put(key, stamp, written)
+        return written
+
+    def create(self, username, user_data):
+        """Insert a new user document; returns it as written, or None if the user already exists"""
+        key = safe_username(username)
+        written = dict(user_data, version=1)
+        with self._writing(username):
+            if not self._save(username, written, None):
+                return None
+            self.cache.invalidate(key)
+            stamp = self._stamp(username)
+            if stamp is not None:
+                self.cache.put(key, stamp, written)
+        return written
+
+    def _writing(self, username):
+        """Lock held from the version check until the new stamp is cached"""
+        return self.user_lock(username)
+
+    def _stamp(self, username):
+        """Cheap validator for the stored data, or None if the user does not exist"""
+        raise NotImplementedError
+
+    def _load(self, username):
+        raise NotImplementedError
+
+    def _save(self, username, user_data, expected_version, rewrite_history=False):
+        """
+        Write user_data only if the stored version equals expected_version; return whether it did.
+        expected_version None is an insert: it fails whenever the user already exists.
+        rewrite_history replaces the stored chat messages instead of appending the new ones.
+        """
+        raise NotImplementedError
+
+    def credentials(self, username):
+        """Password hash and account metadata without the rest of the document, or None"""
+        with self.user_lock(username):
+            user_data = self._current(username)
+        return auth_fields(user_data) if user_data is not None else None
+
+    def exists(self, username):
+        """Check whether a user document exists"""
+        raise NotImplementedError
+
+    def delete(self, username):
+        """Remove a user and all of their data"""
+        raise NotImplementedError
+
+    def list_usernames(self):
+        """Return the stored usernames"""
+        raise NotImplementedError
+
+    def compact(self, username):
+        """Reclaim space held by cleared chat messages; returns whether anything was rewritten"""
+        return False
+
+
+# ---- DURABLE WRITES ----
+class GroupCommit:
+    """
+    Shares fsyncs between concurrent writers. The first writer to arrive becomes the
+    leader: it waits `window` seconds for others to join, fsyncs everything the batch
+    collected and wakes them. Each writer still returns only once its data is on disk.
+    """
+
+    def __init__(self, window=GROUP_COMMIT_WINDOW):
+        self.window = window
+        self._cond = threading.Condition()
+        self._fds = set()
+        self._dirs = set()
+        self._batch = 0  # batch currently collecting writers
+        self._durable = -1  # last batch that reached the disk
+        self._leading = False
+        self._errors = {}  # batch -> OSError raised while syncing it
+        self.batches = 0
+        self.syncs = 0
+
+    def sync(self, fds=(), dirs=()):
+        """Block until the given file descriptors and directories are durable"""
+        with self._cond:
+            self._fds.update(fds)
+            self._dirs.update(dirs)
+            batch = self._batch
+            while self._durable < batch and self._leading:
+                self._cond.wait()
+            lead = self._durable < batch
+            if lead:
+                self._leading = True
+        if lead:
+            self._lead()
+        with self._cond:
+            error = self._errors.get(batch)
+        if error is not None:
+            raise error
+
+    def _lead(self):
+        try:
+            if self.window > 0:
+                time.sleep(self.window)
+            with self._cond:
+                batch = self._batch
+                fds, self._fds = self._fds, set()
+                dirs, self._dirs = self._dirs, set()
+                self._batch += 1
+            try:
+                for fd in fds:
+                    os.fsync(fd)
+                for path in dirs:
+                    _fsync_dir(path)
+            except OSError as e:
+                with self._cond:
+                    self._errors[batch] = e
+            with self._cond:
+                self._durable = batch
+                self._errors.pop(batch - 64, None)
+                self.batches += 1
+                self.syncs += len(fds) + len(dirs)
+        finally:
+            with self._cond:
+                self._leading = False
+                self._cond.notify_all()
+
+
+def _fsync_dir(path):
+    """Persist a rename by syncing its directory (not possible on Windows)"""
+    if os.name == 'nt':
+        return
+    fd = os.open(path or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+_group_commit = GroupCommit()
+
+
+def _sync(f, directory=None, policy=None):
+    """Make a written file (and optionally its directory entry) durable according to the fsync policy"""
+    policy = policy or FSYNC_POLICY
+    if policy == 'never':
+        return
+    f.flush()
+    if policy == 'always':
+        os.fsync(f.fileno())
+        if directory is not None:
+            _fsync_dir(directory)
+    else:
+        _group_commit.sync([f.fileno()], [directory] if directory is not None else ())
+
+
+def atomic_write(path, data, policy=None, exclusive=False):
+    """
+    Replace path with data through a temporary file and a rename, so readers and a crash
+    see either the old or the new contents, never a truncated file. With exclusive=True the
+    file is linked into place instead, which raises FileExistsError if path already exists.
+    """
+    directory = os.path.dirname(path)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            # Data must be durable before the rename can publish it
+            _sync(f, policy=policy)
+        if exclusive:
+            os.link(tmp_path, path)
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    if (policy or FSYNC_POLICY) == 'always':
+        _fsync_dir(directory)
+    elif (policy or FSYNC_POLICY) == 'batched':
+        _group_commit.sync(dirs=[directory])
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Exclusive advisory lock on path (created if missing) between processes. Without fcntl
+    (Windows) it only returns, so one process at a time may write a data directory there.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'ab') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _ends_cleanly(path):
+    """Whether a log file is missing, empty or ends with a complete line"""
+    try:
+        with open(path, 'rb') as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                return True
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+    except FileNotFoundError:
+        return True
+
+
+def append_durable(path, data, policy=None):
+    """Append to a log file; returns the file size after the write"""
+    with open(path, 'ab') as f:
+        f.write(data)
+        _sync(f, policy=policy)
+        return f.tell()
+
+
+# ---- USERNAME & AUTH INDEX ----
+class UserIndex:
+    """
+    Compact append-only index of usernames kept in memory, so existence checks, listings
+    and logins never scan the sharded directory tree or parse a user document.
+    Lines are "+name<TAB>{credentials}" or "-name"; bare "+name" lines from older
+    versions mark users whose credentials have not been indexed yet.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = {}  # username -> credentials dict ({} until indexed)
+        self._records = 0
+        self._offset = 0
+        self._lock = threading.Lock()
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        """Apply records appended since the last read (e.g. by another process)"""
+        try:
+            if os.path.getsize(self.path) <= self._offset:
+                return
+        except FileNotFoundError:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        # Only consume whole lines; a partially written record is picked up next time
+        data = data[:data.rfind(b"\n") + 1]
+        self._offset += len(data)
+        for line in data.decode('utf-8').splitlines():
+            name, _, meta = line[1:].partition('\t')
+            if line[:1] == '+':
+                self._entries[name] = decode(meta) if meta else {}
+            elif line[:1] == '-':
+                self._entries.pop(name, None)
+            self._records += 1
+
+    def __contains__(self, username):
+        return self.get(username) is not None
+
+    def get(self, username):
+        """Indexed credentials of a user ({} if not indexed yet), or None for unknown users"""
+        key = safe_username(username)
+        with self._lock:
+            if key not in self._entries:
+                self._refresh()
+            return self._entries.get(key)
+
+    def names(self):
+        with self._lock:
+            self._refresh()
+            return sorted(self._entries)
+
+    def add(self, username, credentials=None):
+        """Record a user, optionally with their credentials; re-adding replaces the credentials"""
+        key = safe_username(username)
+        line = f"+{key}\t{encode_text(credentials)}" if credentials else f"+{key}"
+        self._append(line, key, credentials or {})
+
+    def remove(self, username):
+        key = safe_username(username)
+        self._append(f"-{key}", key, None)
+
+    def _append(self, line, key, credentials):
+        with self._lock:
+            self._refresh()
+            self._offset = append_durable(self.path, f"{line}\n".encode('utf-8'))
+            if credentials is None:
+                self._entries.pop(key, None)
+            else:
+                self._entries[key] = credentials
+            self._records += 1
+            if self._records > 2 * len(self._entries) + 1024:
+                self._rewrite()
+
+    def rebuild(self, entries):
+        """Replace the index contents (a username -> credentials mapping or plain usernames)"""
+        if not isinstance(entries, dict):
+            entries = dict.fromkeys(entries)
+        with self._lock:
+            self._entries = {safe_username(name): credentials or {} for name, credentials in entries.items()}
+            self._rewrite()
+
+    def _rewrite(self):
+        atomic_write(self.path, ''.join(
+            f"+{name}\t{encode_text(credentials)}\n" if credentials else f"+{name}\n"
+            for name, credentials in sorted(self._entries.items())
+        ).encode('utf-8'))
+        self._records = len(self._entries)
+        self._offset = os.path.getsize(self.path)
+
+
+# ---- JSON FILE BACKEND ----
+class JsonFileStore(UserStore):
+    """
+    Profile document per user (user_<name>.json) plus an append-only chat log
+    (user_<name>.chat.jsonl) so a chat turn only appends its new messages.
+    Files live in two-level hashed shard directories (ab/cd/) under `root`, and a
+    username index backs existence checks and listings. Users still in the flat
+    legacy directory are moved into their shard the first time they are read.
+    """
+
+    def __init__(self, root=DATA_DIR, legacy_root=LEGACY_DIR, cache=None):
+        super().__init__(cache)
+        self.root = root
+        self.legacy_root = legacy_root or None
+        os.makedirs(root, exist_ok=True)
+        self.index = UserIndex(os.path.join(root, "users.idx"))
+        # username -> [live messages, records in the log file], guarded by the user's lock
+        self._log_counts = {}
+        self._file_locked = set()  # users whose lock file this process holds, guarded by the user's lock
+
+    def shard_dir(self, username):
+        digest = hashlib.sha1(safe_username(username).encode('utf-8')).hexdigest()
+        return os.path.join(self.root, digest[:2], digest[2:4])
+
+    def path_for(self, username):
+        return os.path.join(self.shard_dir(username), f"user_{safe_username(username)}.json")
+
+    def log_path_for(self, username):
+        return os.path.join(self.shard_dir(username), f"user_{safe_username(username)}.chat.jsonl")
+
+    def lock_path_for(self, username):
+        return os.path.join(self.shard_dir(username), f"user_{safe_username(username)}.lock")
+
+    @contextmanager
+    def _file_lock(self, username):
+        """
+        The user's lock plus their lock file, so a server and `zyra_admin.py maintain` never
+        interleave a version check, log append or rewrite. The lock file is never replaced.
+        """
+        key = safe_username(username)
+        with self.user_lock(username):
+            if key in self._file_locked:
+                yield
+                return
+            os.makedirs(self.shard_dir(username), exist_ok=True)
+            with file_lock(self.lock_path_for(username)):
+                self._file_locked.add(key)
+                try:
+                    yield
+                finally:
+                    self._file_locked.discard(key)
+
+    def _writing(self, username):
+        return self._file_lock(username)
+
+    def _legacy_paths(self, username, legacy_root=None):
+        legacy_root = legacy_root or self.legacy_root
+        name = f"user_{safe_username(username)}"
+        return os.path.join(legacy_root, f"{name}.json"), os.path.join(legacy_root, f"{name}.chat.jsonl")
+
+    def _stamp(self, username):
+        try:
+            doc = os.stat(self.path_for(username))
+        except FileNotFoundError:
+            if not self._migrate_legacy(username):
+                return None
+            doc = os.stat(self.path_for(username))
+        if doc.st_size == 0:
+            return None
+        try:
+            log = os.stat(self.log_path_for(username))
+            log_stamp = (log.st_ino, log.st_mtime_ns, log.st_size)
+        except FileNotFoundError:
+            log_stamp = None
+        return (doc.st_ino, doc.st_mtime_ns, doc.st_size, log_stamp)
+
+    def _migrate_legacy(self, username, legacy_root=None):
+        """Move a user's flat-layout files into their shard; returns whether there was anything to move"""
+        if not (legacy_root or self.legacy_root):
+            return False
+        doc_path, log_path = self._legacy_paths(username, legacy_root)
+        if not os.path.exists(doc_path):
+            return False
+        os.makedirs(self.shard_dir(username), exist_ok=True)
+        # Log first: a document without its log would be read as a legacy embedded history
+        if os.path.exists(log_path):
+            shutil.move(log_path, self.log_path_for(username))
+        shutil.move(doc_path, self.path_for(username))
+        self.index.add(username)
+        return True
+
+    def _load(self, username):
+        path = self.path_for(username)
+        with open(path, 'rb') as f:
+            user_data = decode(f.read())
+        replayed = self._read_log(username)
+        if replayed is not None:
+            self._log_counts[safe_username(username)] = [len(replayed[0]), replayed[1]]
+            user_data['chat_history'] = replayed[0]
+        else:
+            # Legacy document that still embeds its chat history
+            user_data.setdefault('chat_history', [])
+        return user_data
+
+    def _save(self, username, user_data, expected_version, rewrite_history=False):
+        # Callers hold the lock file (_writing), so checking the stored version then writing is atomic across processes
+        current = self._current(username)
+        if expected_version is None:
+            return current is None and self._create(username, user_data)
+        if current is not None and current.get('version', 0) != expected_version:
+            return False
+        chat_history = user_data.get('chat_history', [])
+        document = {k: v for k, v in user_data.items() if k != 'chat_history'}
+        self._sync_log(username, chat_history, rewrite_history)
+        atomic_write(self.path_for(username), encode(document))
+        credentials = auth_fields(user_data)
+        if self.index.get(username) != credentials:
+            self.index.add(username, credentials)
+        return True
+
+    def _create(self, username, user_data):
+        """Insert-only write; linking the document into place fails if another process created it first"""
+        document = {k: v for k, v in user_data.items() if k != 'chat_history'}
+        try:
+            atomic_write(self.path_for(username), encode(document), exclusive=True)
+        except FileExistsError:
+            return False
+        # The log only once the document is ours, so a lost race never touches the other account's log
+        self._rewrite_log(username, user_data.get('chat_history', []))
+        self.index.add(username, auth_fields(user_data))
+        return True
+
+    def credentials(self, username):
+        credentials = self.index.get(username)
+        if credentials:
+            return dict(credentials)
+        if credentials is None and not self.exists(username):
+            return None
+        # Indexed by an older version (or still in the flat layout): read the document once and backfill
+        credentials = super().credentials(username)
+        if credentials is not None:
+            self.index.add(username, credentials)
+        return credentials
+
+    def exists(self, username):
+        if username in self.index:
+            return True
+        # Users that have not been migrated out of the flat layout yet
+        return bool(self.legacy_root) and os.path.exists(self._legacy_paths(username)[0])
+
+    def delete(self, username):
+        self.cache.invalidate(safe_username(username))
+        # The lock file stays: removing it could let two processes lock different files
+        with self._file_lock(username):
+            for path in (self.path_for(username), self.log_path_for(username)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._log_counts.pop(safe_username(username), None)
+            self.index.remove(username)
+
+    def list_usernames(self):
+        return self.index.names()
+
+    # ---- LAYOUT MAINTENANCE ----
+    def purge_legacy(self, prefix):
+        """Delete flat-layout files of users whose name starts with prefix; returns the user count"""
+        if not self.legacy_root:
+            return 0
+        removed = 0
+        with os.scandir(self.legacy_root) as entries:
+            for entry in entries:
+                if entry.name.startswith(f"user_{prefix}") and entry.is_file():
+                    os.remove(entry.path)
+                    removed += entry.name.endswith(".json")
+        return removed
+
+    def migrate_flat_layout(self, source=None):
+        """Move every user_*.json in a flat directory into the sharded layout, yielding (name, moved)"""
+        source = source or self.legacy_root
+        with os.scandir(source) as entries:
+            for entry in entries:
+                name = entry.name
+                if not (name.startswith("user_") and name.endswith(".json") and entry.is_file()):
+                    continue
+                username = name[len("user_"):-len(".json")]
+                with self.user_lock(username):
+                    if os.path.exists(self.path_for(username)):
+                        yield username, False
+                        continue
+                    yield username, self._migrate_legacy(username, source)
+
+    def rebuild_index(self):
+        """Rebuild the username and auth index by walking the shard directories; returns the user count"""
+        entries = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.startswith("user_") and name.endswith(".json"):
+                    try:
+                        with open(os.path.join(dirpath, name), 'rb') as f:
+                            credentials = auth_fields(decode(f.read()))
+                    except ValueError:
+                        credentials = None
+                    entries[name[len("user_"):-len(".json")]] = credentials
+        self.index.rebuild(entries)
+        return len(entries)
+
+    # ---- CHAT LOG ----
+    def _read_log(self, username):
+        """Replay the chat log into [messages, record count], or None when the user has no log yet"""
+        path = self.log_path_for(username)
+        if not os.path.exists(path):
+            return None
+        messages = []
+        records = 0
+        good_bytes = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    record = decode(line)
+                except ValueError:
+                    if line.strip():
+                        # Without the lock file this may be another process's append still in progress,
+                        # so it is only skipped; with it, it is a torn tail and is cut so later appends stay readable
+                        if safe_username(username) in self._file_locked:
+                            os.truncate(path, good_bytes)
+                        break
+                    record = None
+                good_bytes += len(line)
+                if record is None:
+                    continue
+                records += 1
+                if record.get('_op') == 'clear':
+                    messages = []
+                else:
+                    messages.append(record)
+        return messages, records
+
+    def _log_count(self, username):
+        """Return [live messages, records] for the user's log, replaying it on first use"""
+        key = safe_username(username)
+        if key not in self._log_counts:
+            replayed = self._read_log(username)
+            if replayed is None:
+                return None
+            self._log_counts[key] = [len(replayed[0]), replayed[1]]
+        return self._log_counts[key]
+
+    def _sync_log(self, username, chat_history, rewrite=False):
+        """Append messages the log has not seen; a shorter or rewritten history is recorded as clear + re-append"""
+        if not _ends_cleanly(self.log_path_for(username)):
+            # Torn tail from an interrupted append: replaying under the lock file cuts it
+            self._log_counts.pop(safe_username(username), None)
+        counts = self._log_count(username)
+        if counts is None:
+            self._rewrite_log(username, chat_history)
+            return
+        live, records = counts
+        if rewrite or len(chat_history) < live:
+            new_records = [{'_op': 'clear'}] + list(chat_history)
+            live = 0
+        else:
+            new_records = chat_history[live:]
+        if new_records:
+            append_durable(self.log_path_for(username), b''.join(encode_line(record) for record in new_records))
+            live += len(new_records) - (1 if new_records[0].get('_op') == 'clear' else 0)
+            records += len(new_records)
+        self._log_counts[safe_username(username)] = [live, records]
+        if records - live > max(COMPACT_MIN_DEAD_RECORDS, live):
+            self._rewrite_log(username, chat_history)
+
+    def _rewrite_log(self, username, chat_history):
+        """Write the live messages to a fresh log, dropping cleared records"""
+        atomic_write(self.log_path_for(username), b''.join(encode_line(message) for message in chat_history))
+        self._log_counts[safe_username(username)] = [len(chat_history), len(chat_history)]
+
+    def compact(self, username):
+        """
+        Rewrite a user's chat log so it only holds live messages; logs without cleared records are
+        left alone. The lock file keeps a server process from appending while the log is rewritten.
+        """
+        if not os.path.exists(self.log_path_for(username)):
+            return False
+        with self._file_lock(username):
+            replayed = self._read_log(username)
+            if replayed is None:
+                return False
+            messages, records = replayed
+            if records == len(messages):
+                return False
+            self._rewrite_log(username, messages)
+            self.cache.invalidate(safe_username(username))
+            return True
+
+
+# ---- SQLITE BACKEND ----
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL DEFAULT '',
+    created_at TEXT,
+    xp INTEGER NOT NULL DEFAULT 0,
+    level INTEGER NOT NULL DEFAULT 1,
+    streak INTEGER NOT NULL DEFAULT 1,
+    last_active TEXT,
+    extra TEXT NOT NULL DEFAULT '{}',
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS profile_fields (
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (username, field)
+);
+CREATE TABLE IF NOT EXISTS skills (
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    category TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    PRIMARY KEY (username, category, name)
+);
+CREATE TABLE IF NOT EXISTS goals (
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    bucket TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (username, bucket, position)
+);
+CREATE TABLE IF NOT EXISTS badges (
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    badge TEXT NOT NULL,
+    PRIMARY KEY (username, position)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    sender TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_by_user ON messages(username, id);
+"""
+
+
+class SQLiteStore(UserStore):
+    """Normalized tables in a single SQLite database running in WAL mode"""
+
+    def __init__(self, path=SQLITE_PATH, cache=None, pool_size=SQLITE_POOL_SIZE):
+        super().__init__(cache)
+        self.path = path
+        self.pool_size = pool_size
+        self._pool = queue.LifoQueue()
+        with self._connection() as conn:
+            # WAL is a property of the database file, so it is set once rather than per connection
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+            if 'version' not in columns:
+                conn.execute("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute(f"PRAGMA synchronous={_SQLITE_SYNCHRONOUS[FSYNC_POLICY]}")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        """
+        Borrow a pooled connection. Streamlit runs every rerun on a fresh thread, so connections
+        belong to the pool rather than to threads and are only opened when none is idle.
+        """
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction or self._pool.qsize() >= self.pool_size:
+                conn.close()
+            else:
+                self._pool.put(conn)
+
+    def _stamp(self, username):
+        with self._connection() as conn:
+            row = conn.execute("SELECT version FROM users WHERE username = ?", (safe_username(username),)).fetchone()
+        return row[0] if row else None
+
+    def _load(self, username):
+        key = safe_username(username)
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT password, created_at, xp, level, streak, last_active, extra, version FROM users WHERE username = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            user_data = decode(row[6])
+            user_data.update(zip(_USER_COLUMNS, row[:6]))
+            user_data['version'] = row[7]
+
+            user_data['profile'] = {
+                field: decode(value) for field, value in conn.execute(
+                    "SELECT field, value FROM profile_fields WHERE username = ?", (key,)
+                )
+            }
+            skills = {'technical': {}, 'soft': {}}
+            for category, name, level in conn.execute(
+                "SELECT category, name, level FROM skills WHERE username = ? ORDER BY category, position", (key,)
+            ):
+                skills.setdefault(category, {})[name] = level
+            user_data['skills'] = skills
+
+            goals = {'short_term': [], 'long_term': [], 'completed': []}
+            for bucket, data in conn.execute(
+                "SELECT bucket, data FROM goals WHERE username = ? ORDER BY bucket, position", (key,)
+            ):
+                goals.setdefault(bucket, []).append(decode(data))
+            user_data['goals_tracking'] = goals
+
+            user_data['badges'] = [badge for (badge,) in conn.execute(
+                "SELECT badge FROM badges WHERE username = ? ORDER BY position", (key,)
+            )]
+            user_data['chat_history'] = [
+                _row_to_message(row) for row in conn.execute(
+                    "SELECT sender, content, timestamp, extra FROM messages WHERE username = ? ORDER BY id", (key,)
+                )
+            ]
+            return user_data
+
+    def _save(self, username, user_data, expected_version, rewrite_history=False):
+        key = safe_username(username)
+        extra = {k: v for k, v in user_data.items()
+                 if k not in _USER_COLUMNS and k not in _TABLE_FIELDS and k != 'version'}
+        with self._connection() as conn:
+            # BEGIN IMMEDIATE takes the write lock, so the version check and the write are atomic
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT version FROM users WHERE username = ?", (key,)).fetchone()
+                if (row is not None) if expected_version is None else (row[0] if row else 0) != expected_version:
+                    conn.execute("ROLLBACK")
+                    return False
+                conn.execute(
+                    """INSERT INTO users (username, password, created_at, xp, level, streak, last_active, extra, version)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT(username) DO UPDATE SET
+                           password = excluded.password, created_at = excluded.created_at,
+                           xp = excluded.xp, level = excluded.level, streak = excluded.streak,
+                           last_active = excluded.last_active, extra = excluded.extra,
+                           version = excluded.version""",
+                    (key, user_data.get('password', ''), user_data.get('created_at'),
+                     user_data.get('xp', 0), user_data.get('level', 1), user_data.get('streak', 1),
+                     user_data.get('last_active'), encode_text(extra), user_data['version'])
+                )
+                self._write_children(conn, key, user_data)
+                self._sync_messages(conn, key, user_data.get('chat_history', []), rewrite_history)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return True
+
+    def _write_children(self, conn, key, user_data):
+        # Profile, skills, goals and badges are small, so they are replaced wholesale
+        for table in ('profile_fields', 'skills', 'goals', 'badges'):
+            conn.execute(f"DELETE FROM {table} WHERE username = ?", (key,))
+        conn.executemany(
+            "INSERT INTO profile_fields (username, field, value) VALUES (?, ?, ?)",
+            [(key, field, encode_text(value)) for field, value in user_data.get('profile', {}).items()]
+        )
+        conn.executemany(
+            "INSERT INTO skills (username, category, position, name, level) VALUES (?, ?, ?, ?, ?)",
+            [(key, category, i, name, level)
+             for category, entries in user_data.get('skills', {}).items()
+             for i, (name, level) in enumerate(entries.items())]
+        )
+        conn.executemany(
+            "INSERT INTO goals (username, bucket, position, data) VALUES (?, ?, ?, ?)",
+            [(key, bucket, i, encode_text(goal))
+             for bucket, entries in user_data.get('goals_tracking', {}).items()
+             for i, goal in enumerate(entries)]
+        )
+        conn.executemany(
+            "INSERT INTO badges (username, position, badge) VALUES (?, ?, ?)",
+            [(key, i, badge) for i, badge in enumerate(user_data.get('badges', []))]
+        )
+
+    def _sync_messages(self, conn, key, chat_history, rewrite=False):
+        """Insert only messages that are not stored yet; rewrite if history was cleared, trimmed or edited"""
+        (stored,) = conn.execute("SELECT COUNT(*) FROM messages WHERE username = ?", (key,)).fetchone()
+        if rewrite or len(chat_history) < stored:
+            conn.execute("DELETE FROM messages WHERE username = ?", (key,))
+            stored = 0
+        conn.executemany(
+            "INSERT INTO messages (username, sender, content, timestamp, extra) VALUES (?, ?, ?, ?, ?)",
+            [(key,) + _message_to_row(message) for message in chat_history[stored:]]
+        )
+
+    def credentials(self, username):
+        # Primary-key lookup on the users table; profile and messages are never read
+        with self._connection() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(_AUTH_FIELDS)} FROM users WHERE username = ?", (safe_username(username),)
+            ).fetchone()
+        return dict(zip(_AUTH_FIELDS, row)) if row else None
+
+    def exists(self, username):
+        with self._connection() as conn:
+            row = conn.execute("SELECT 1 FROM users WHERE username = ?", (safe_username(username),)).fetchone()
+        return row is not None
+
+    def delete(self, username):
+        self.cache.invalidate(safe_username(username))
+        with self._connection() as conn:
+            conn.execute("DELETE FROM users WHERE username = ?", (safe_username(username),))
+
+    def list_usernames(self):
+        with self._connection() as conn:
+            return [name for (name,) in conn.execute("SELECT username FROM users ORDER BY username")]
+
+
+def _message_to_row(message):
+    extra = {k: v for k, v in message.items() if k not in _MESSAGE_COLUMNS}
+    return (message.get('sender', ''), str(message.get('content', '')), message.get('timestamp'),
+            encode_text(extra) if extra else None)
+
+
+def _row_to_message(row):
+    sender, content, timestamp, extra = row
+    message = {'sender': sender, 'content': content, 'timestamp': timestamp}
+    if extra:
+        message.update(decode(extra))
+    return message
+
+
+# ---- EPHEMERAL BACKEND ----
+class EphemeralStore(UserStore):
+    """Bounded in-memory store with idle TTL, used for demo accounts that must never touch disk"""
+
+    def __init__(self, ttl=DEMO_TTL, max_entries=DEMO_MAX_ACCOUNTS):
+        # Documents already live in memory, so the shared parse cache would only duplicate them
+        super().__init__(UserDocumentCache(max_bytes=0))
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._docs = OrderedDict()  # key -> [document, last access]
+        self._lock = threading.Lock()
+
+    def _entry(self, key):
+        entry = self._docs.get(key)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now - entry[1] > self.ttl:
+            del self._docs[key]
+            return None
+        entry[1] = now
+        self._docs.move_to_end(key)
+        return entry
+
+    def _stamp(self, username):
+        with self._lock:
+            entry = self._entry(safe_username(username))
+            return entry[0].get('version', 0) if entry else None
+
+    def _load(self, username):
+        with self._lock:
+            entry = self._entry(safe_username(username))
+            return copy_document(entry[0]) if entry else None
+
+    def _save(self, username, user_data, expected_version, rewrite_history=False):
+        key = safe_username(username)
+        with self._lock:
+            entry = self._entry(key)
+            if entry is not None and (expected_version is None or entry[0].get('version', 0) != expected_version):
+                return False
+            self._docs[key] = [copy_document(user_data), time.monotonic()]
+            self._docs.move_to_end(key)
+            while len(self._docs) > self.max_entries:
+                self._docs.popitem(last=False)
+        return True
+
+    def exists(self, username):
+        with self._lock:
+            return self._entry(safe_username(username)) is not None
+
+    def delete(self, username):
+        with self._lock:
+            self._docs.pop(safe_username(username), None)
+
+    def list_usernames(self):
+        self.purge_expired()
+        with self._lock:
+            return list(self._docs)
+
+    def purge_expired(self):
+        """Drop every account idle for longer than the TTL; returns how many were dropped"""
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            expired = [key for key, entry in self._docs.items() if entry[1] < cutoff]
+            for key in expired:
+                del self._docs[key]
+        return len(expired)
+
+
+def is_demo_username(username):
+    return safe_username(username).startswith(DEMO_PREFIX)
+
+
+def reap_demo_users(store):
+    """Delete demo accounts that older versions persisted to disk; returns the number removed"""
+    removed = 0
+    for username in store.list_usernames():
+        if username.startswith(DEMO_PREFIX):
+            store.delete(username)
+            removed += 1
+    if isinstance(store, JsonFileStore):
+        removed += store.purge_legacy(DEMO_PREFIX)
+    return removed
+
+
+# ---- BACKEND SELECTION ----
+_store = None
+_demo_store = None
+_reaper = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide store for the configured backend"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if FSYNC_POLICY not in _FSYNC_POLICIES:
+                    raise ValueError(f"Unknown ZYRA_FSYNC_POLICY: {FSYNC_POLICY}")
+                if STORAGE_BACKEND == "sqlite":
+                    _store = SQLiteStore(SQLITE_PATH)
+                elif STORAGE_BACKEND == "json":
+                    _store = JsonFileStore(DATA_DIR, LEGACY_DIR)
+                else:
+                    raise ValueError(f"Unknown ZYRA_STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return _store
+
+
+def get_demo_store():
+    """Return the process-wide in-memory store for demo accounts"""
+    global _demo_store
+    if _demo_store is None:
+        with _store_lock:
+            if _demo_store is None:
+                _demo_store = EphemeralStore()
+    return _demo_store
+
+
+def get_store_for(username):
+    """Demo accounts live in memory; everyone else in the configured backend"""
+    return get_demo_store() if is_demo_username(username) else get_store()
+
+
+def start_demo_reaper():
+    """Start the background demo reaper once per process"""
+    global _reaper
+    with _store_lock:
+        if _reaper is not None:
+            return
+        _reaper = threading.Thread(target=_run_demo_reaper, name="zyra-demo-reaper", daemon=True)
+    _reaper.start()
+
+
+def _run_demo_reaper():
+    while True:
+        try:
+            removed = reap_demo_users(get_store())
+            expired = get_demo_store().purge_expired()
+            if removed or expired:
+                logger.info("Demo reaper removed %d stored and %d expired demo accounts", removed, expired)
+        except Exception:
+            logger.exception("Demo reaper failed")
+        time.sleep(DEMO_REAP_INTERVAL)
@@ -0,0 +1,219 @@
+"""
+Admin command line for the Zyra user store
+Run: python zyra_admin.py <command> [options]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+
+import user_store
+from user_codec import encode
+from user_schema import migrate_user_data, validate_user_data
+
+
+def get_json_store(args):
+    if user_store.STORAGE_BACKEND != "json":
+        sys.exit("This command only applies to the json storage backend (ZYRA_STORAGE_BACKEND=json)")
+    return user_store.JsonFileStore(args.data_dir, args.legacy_dir)
+
+
+def open_backend_store(data_dir, legacy_dir, sqlite_path):
+    """A private store for one process; documents are streamed, so nothing is cached"""
+    cache = user_store.UserDocumentCache(max_bytes=0)
+    if user_store.STORAGE_BACKEND == "sqlite":
+        return user_store.SQLiteStore(sqlite_path, cache)
+    return user_store.JsonFileStore(data_dir, legacy_dir, cache)
+
+
+def cmd_migrate_layout(args):
+    """Move flat user_*.json files into the sharded data directory"""
+    store = get_json_store(args)
+    moved = skipped = 0
+    start = time.perf_counter()
+    for username, was_moved in store.migrate_flat_layout(args.legacy_dir):
+        if was_moved:
+            moved += 1
+        else:
+            skipped += 1
+            print(f"skipped {username}: already present in {args.data_dir}", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    print(f"Moved {moved} users, skipped {skipped} in {elapsed:.1f}s")
+
+
+def cmd_rebuild_index(args):
+    """Rebuild the username index from the shard directories"""
+    count = get_json_store(args).rebuild_index()
+    print(f"Indexed {count} users")
+
+
+def cmd_reap_demo(args):
+    """Delete demo accounts that older versions wrote to disk"""
+    store = get_json_store(args) if user_store.STORAGE_BACKEND == "json" else user_store.get_store()
+    print(f"Removed {user_store.reap_demo_users(store)} demo accounts")
+
+
+def cmd_list_users(args):
+    """Print stored usernames"""
+    store = user_store.get_store()
+    for username in store.list_usernames():
+        if username.startswith(args.prefix):
+            print(username)
+
+
+# ---- MAINTENANCE ----
+_worker_store = None
+_worker_dry_run = False
+
+
+def _init_maintenance_worker(data_dir, legacy_dir, sqlite_path, dry_run):
+    global _worker_store, _worker_dry_run
+    _worker_store = open_backend_store(data_dir, legacy_dir, sqlite_path)
+    _worker_dry_run = dry_run
+
+
+def maintain_user(username):
+    """Validate, migrate, compact and re-save one user; runs inside a pool worker"""
+    result = {'username': username, 'bytes': 0, 'messages': 0, 'problems': [], 'changes': [], 'error': None}
+    try:
+        user_data = _worker_store.load(username)
+        if user_data is None:
+            result['error'] = "not found"
+            return result
+        base = user_store.copy_document(user_data)
+        result['problems'] = validate_user_data(user_data)
+        result['changes'] = migrate_user_data(user_data)
+        if not _worker_dry_run:
+            if result['changes']:
+                user_data = _worker_store.save(username, user_data, base)
+            if _worker_store.compact(username):
+                result['changes'].append("compacted chat log")
+        result['bytes'] = len(encode(user_data))
+        result['messages'] = len(user_data['chat_history'])
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def _read_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, encoding='utf-8') as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def _throttled(usernames, max_rate):
+    """Yield usernames no faster than max_rate per second (0 = unlimited)"""
+    interval = 1.0 / max_rate if max_rate > 0 else 0
+    next_at = time.monotonic()
+    for username in usernames:
+        if interval:
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_at = max(next_at, time.monotonic() - interval) + interval
+        yield username
+
+
+def _log2_bucket(value):
+    return 0 if value <= 0 else 1 << (int(value).bit_length() - 1)
+
+
+def _print_histogram(title, counts, unit):
+    print(f"\n{title}")
+    if not counts:
+        print("  (no data)")
+        return
+    peak = max(counts.values())
+    for bucket in sorted(counts):
+        label = f"{bucket:,}-{bucket * 2 - 1:,} {unit}" if bucket > 1 else f"{bucket} {unit}"
+        bar = '#' * max(1, round(40 * counts[bucket] / peak))
+        print(f"  {label:>26} {counts[bucket]:>8,} {bar}")
+
+
+def cmd_maintain(args):
+    """Validate, migrate and compact every user with a pool of worker processes"""
+    done = _read_checkpoint(args.checkpoint)
+    store = open_backend_store(args.data_dir, args.legacy_dir, args.sqlite_path)
+    todo = [username for username in store.list_usernames() if username not in done]
+    print(f"{len(todo)} users to process ({len(done)} already done per checkpoint), "
+          f"{args.workers} workers{' [dry run]' if args.dry_run else ''}")
+
+    sizes, message_counts = Counter(), Counter()
+    processed = migrated = invalid = failed = total_bytes = 0
+    start = last_report = time.perf_counter()
+    checkpoint = open(args.checkpoint, 'a', encoding='utf-8') if args.checkpoint and not args.dry_run else None
+    pool = multiprocessing.Pool(
+        args.workers, _init_maintenance_worker,
+        (args.data_dir, args.legacy_dir, args.sqlite_path, args.dry_run),
+    )
+    try:
+        for result in pool.imap_unordered(maintain_user, _throttled(todo, args.max_rate), chunksize=args.chunk_size):
+            processed += 1
+            if result['error']:
+                failed += 1
+                print(f"error {result['username']}: {result['error']}", file=sys.stderr)
+                continue
+            invalid += bool(result['problems'])
+            migrated += bool(result['changes'])
+            total_bytes += result['bytes']
+            sizes[_log2_bucket(result['bytes'])] += 1
+            message_counts[_log2_bucket(result['messages'])] += 1
+            if args.verbose and result['changes']:
+                print(f"{result['username']}: {'; '.join(result['changes'])}")
+            if checkpoint:
+                checkpoint.write(result['username'] + "\n")
+            now = time.perf_counter()
+            if now - last_report >= args.report_every:
+                last_report = now
+                elapsed = now - start
+                print(f"  {processed}/{len(todo)} users  {processed / elapsed:,.0f} users/s  "
+                      f"{total_bytes / elapsed / 1e6:,.1f} MB/s")
+                if checkpoint:
+                    checkpoint.flush()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+        if checkpoint:
+            checkpoint.close()
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f"\nProcessed {processed} users in {elapsed:.1f}s ({processed / elapsed:,.0f} users/s, "
+          f"{total_bytes / elapsed / 1e6:,.1f} MB/s): {invalid} had schema problems, "
+          f"{migrated} {'would be ' if args.dry_run else ''}migrated, {failed} failed")
+    _print_histogram("Document size", sizes, "bytes")
+    _print_histogram("Chat messages per user", message_counts, "msgs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", default=user_store.DATA_DIR, help="sharded data root (json backend)")
+    parser.add_argument("--legacy-dir", default=user_store.LEGACY_DIR, help="flat directory of legacy user files")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("migrate-layout", help=cmd_migrate_layout.__doc__).set_defaults(func=cmd_migrate_layout)
+    sub.add_parser("rebuild-index", help=cmd_rebuild_index.__doc__).set_defaults(func=cmd_rebuild_index)
+    sub.add_parser("reap-demo", help=cmd_reap_demo.__doc__).set_defaults(func=cmd_reap_demo)
+    list_users = sub.add_parser("list-users", help=cmd_list_users.__doc__)
+    list_users.add_argument("--prefix", default="", help="only list usernames starting with this prefix")
+    list_users.set_defaults(func=cmd_list_users)
+    maintain = sub.add_parser("maintain", help=cmd_maintain.__doc__)
+    maintain.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    maintain.add_argument("--sqlite-path", default=user_store.SQLITE_PATH, help="database file (sqlite backend)")
+    maintain.add_argument("--checkpoint", help="file of finished usernames; rerun with the same file to resume")
+    maintain.add_argument("--max-rate", type=float, default=0, help="maximum users per second (0 = unlimited)")
+    maintain.add_argument("--chunk-size", type=int, default=16, help="users handed to a worker at a time")
+    maintain.add_argument("--report-every", type=float, default=5.0, help="seconds between progress lines")
+    maintain.add_argument("--dry-run", action="store_true", help="validate and report without writing")
+    maintain.add_argument("--verbose", action="store_true", help="print every change made")
+    maintain.set_defaults(func=cmd_maintain)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()